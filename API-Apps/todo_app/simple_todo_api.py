@@ -1,34 +1,557 @@
 # simple_todo_api.py
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 import json
 import os
-from datetime import datetime
-import uuid
+from datetime import datetime, timedelta
+import tempfile
+import heapq
+import itertools
+import shutil
+import threading
+from bisect import bisect_left, insort
 
 app = Flask(__name__)
 
-# Data file
+# Data files: todos.json is the last snapshot, todos.json.wal the records since it
 TODOS_FILE = 'todos.json'
+WAL_FILE = TODOS_FILE + '.wal'
 
-def load_todos():
-    """Load todos from JSON file"""
-    if os.path.exists(TODOS_FILE):
-        try:
-            with open(TODOS_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-    return []
-
-def save_todos(todos):
-    """Save todos to JSON file"""
-    with open(TODOS_FILE, 'w') as f:
-        json.dump(todos, f, indent=2)
-
-def find_todo_by_id(todo_id):
-    """Find a todo by ID"""
-    todos = load_todos()
-    return next((todo for todo in todos if todo['id'] == todo_id), None)
+# Compact once the log holds this many records, or half as many as there are
+# todos if that is more, and in any case every COMPACT_INTERVAL seconds
+COMPACT_MIN_RECORDS = int(os.environ.get('TODO_COMPACT_MIN_RECORDS', 1000))
+COMPACT_INTERVAL = float(os.environ.get('TODO_COMPACT_INTERVAL', 300))
+WAL_FSYNC = os.environ.get('TODO_WAL_FSYNC', 'true').lower() == 'true'
+
+# GET /todos paging: largest accepted limit, and todos serialized per streamed chunk
+MAX_PAGE_SIZE = int(os.environ.get('TODO_MAX_PAGE_SIZE', 1000))
+STREAM_CHUNK_TODOS = 500
+# Filtered pages walk the store order from the cursor when at least one todo
+# in this many matches; rarer matches are picked from the smallest index
+PAGE_SCAN_RATIO = 16
+
+# Largest number of todos one bulk request may carry
+BULK_MAX_ITEMS = int(os.environ.get('TODO_BULK_MAX_ITEMS', 100000))
+
+# Deletions remembered for /todos/changes; clients further behind must resync
+TOMBSTONE_LIMIT = int(os.environ.get('TODO_TOMBSTONE_LIMIT', 100000))
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+class TodoStore:
+    """In-memory todos made durable by an append-only write-ahead log
+    
+    Every change appends one JSON line ({"op": "create"|"update"|"delete", ...})
+    to the log and is applied to the in-memory dict; reads never touch disk.
+    Records carry the whole todo, so replaying them is idempotent. Compaction
+    rotates the log, writes a fresh snapshot from a copy of the state and then
+    drops the rotated log; recovery loads the snapshot and replays the rotated
+    and current logs, ignoring a torn last line.
+    
+    Secondary indexes are kept in step with every applied record, including
+    replayed ones: id sets per completion status, priority and tag, and sorted
+    (value, id) lists of created_at for all todos and due_date for open ones.
+    Their sizes double as the counters behind /stats and /health. Results are
+    listed by the seq that created each todo, which is also the paging
+    cursor; the snapshot keeps it, so a cursor stays valid across restarts.
+    
+    Every record also takes the next change sequence number. The store keeps
+    the last seq per id in change order, with tombstones for deleted ids, so
+    the changes after a given seq can be read from the end of that log.
+    """
+
+    def __init__(self, snapshot_path, wal_path):
+        self.snapshot_path = snapshot_path
+        self.wal_path = wal_path
+        self.todos = {}
+        self.wal_records = 0
+        self.wal_bytes = 0  # size of the current log, kept in step so status() stays off disk
+        self.seq = 0
+        self.horizon = 0  # changes up to here may have lost their tombstones
+        self._reset_indexes()
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._wal = None
+        self._compactor = None
+        self._compactor_pid = None
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, 'r') as f:
+                    snapshot = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                snapshot = []
+            if isinstance(snapshot, list):
+                snapshot = {'todos': snapshot}  # written before change sequences
+            versions = snapshot.get('versions', {})
+            for todo in snapshot['todos']:
+                created_seq, seq = versions.get(todo['id'], (None, None))
+                self._apply({'op': 'create', 'todo': todo, 'seq': seq}, created_seq)
+            self.tombstones = snapshot.get('tombstones', {})
+            self.seq = max(self.seq, snapshot.get('seq', 0))
+            self.horizon = snapshot.get('horizon', 0)
+            # Snapshot order is store order; put the change log back in seq order
+            changes = list(self.changelog.items()) + list(self.tombstones.items())
+            self.changelog = dict(sorted(changes, key=lambda change: change[1]))
+        for path in (self.wal_path + '.old', self.wal_path):
+            if os.path.exists(path):
+                self.wal_records += self._replay(path)
+        if os.path.exists(self.wal_path):
+            self.wal_bytes = os.path.getsize(self.wal_path)
+
+    def _replay(self, path):
+        records = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    # The snapshot already covers records up to its seq
+                    if record.get('seq') is None or record['seq'] > self.seq:
+                        self._apply(record)
+                except (ValueError, KeyError):
+                    break  # a torn write from a crash; nothing after it was acknowledged
+                good_offset += len(line)
+                records += 1
+        if good_offset != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+        return records
+
+    def _apply(self, record, created_seq=None):
+        seq = record.get('seq') or self.seq + 1
+        self.seq = max(self.seq, seq)
+        if record['op'] == 'delete':
+            todo = self.todos.pop(record['id'], None)
+            if todo is not None:
+                self._unindex(todo)
+                self._remove_sorted(self.order, (self.created_seq.pop(todo['id']), todo['id']))
+                self._log_change(todo['id'], seq)
+                self.tombstones[todo['id']] = seq
+                if len(self.tombstones) > TOMBSTONE_LIMIT:
+                    self._drop_oldest_tombstone()
+        else:
+            todo = record['todo']
+            old = self.todos.get(todo['id'])
+            if old is not None:
+                self._unindex(old)
+            else:
+                self.created_seq[todo['id']] = created_seq or seq
+                insort(self.order, (self.created_seq[todo['id']], todo['id']))
+                self.tombstones.pop(todo['id'], None)
+            self.todos[todo['id']] = todo
+            self._index(todo)
+            self._log_change(todo['id'], seq)
+
+    # Change log
+
+    def _log_change(self, todo_id, seq):
+        self.changelog.pop(todo_id, None)  # re-insert to move it to the end
+        self.changelog[todo_id] = seq
+
+    def _drop_oldest_tombstone(self):
+        todo_id = next(iter(self.tombstones))
+        seq = self.tombstones.pop(todo_id)
+        del self.changelog[todo_id]
+        self.horizon = max(self.horizon, seq)
+
+    # Secondary indexes
+
+    def _reset_indexes(self):
+        self.by_status = {'completed': set(), 'pending': set()}
+        self.by_priority = {}
+        self.by_tag = {}
+        self.created = []
+        self.open_due = []
+        self.changelog = {}  # id -> seq of its last change, oldest first; includes tombstones
+        self.created_seq = {}  # id -> seq that created it; orders results
+        self.order = []  # (created seq, id), also the paging key
+        self.tombstones = {}  # deleted id -> seq of the delete, oldest first
+
+    @staticmethod
+    def _status(todo):
+        return 'completed' if todo.get('completed', False) else 'pending'
+
+    @staticmethod
+    def _tags(todo):
+        tags = todo.get('tags')
+        if not isinstance(tags, list):
+            return set()
+        return {tag for tag in tags if isinstance(tag, str)}
+
+    def _index(self, todo):
+        todo_id = todo['id']
+        self.by_status[self._status(todo)].add(todo_id)
+        priority = todo.get('priority')
+        if isinstance(priority, str):
+            self.by_priority.setdefault(priority.lower(), set()).add(todo_id)
+        for tag in self._tags(todo):
+            self.by_tag.setdefault(tag, set()).add(todo_id)
+        if isinstance(todo.get('created_at'), str):
+            insort(self.created, (todo['created_at'], todo_id))
+        if isinstance(todo.get('due_date'), str) and not todo.get('completed', False):
+            insort(self.open_due, (todo['due_date'], todo_id))
+
+    def _unindex(self, todo):
+        todo_id = todo['id']
+        self.by_status[self._status(todo)].discard(todo_id)
+        priority = todo.get('priority')
+        if isinstance(priority, str):
+            self._discard(self.by_priority, priority.lower(), todo_id)
+        for tag in self._tags(todo):
+            self._discard(self.by_tag, tag, todo_id)
+        if isinstance(todo.get('created_at'), str):
+            self._remove_sorted(self.created, (todo['created_at'], todo_id))
+        if isinstance(todo.get('due_date'), str) and not todo.get('completed', False):
+            self._remove_sorted(self.open_due, (todo['due_date'], todo_id))
+
+    @staticmethod
+    def _discard(index, key, todo_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(todo_id)
+            if not ids:
+                del index[key]
+
+    @staticmethod
+    def _remove_sorted(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    @staticmethod
+    def _between(entries, low=None, high=None):
+        """Slice bounds of the entries with low <= value < high"""
+        start = bisect_left(entries, (low,)) if low is not None else 0
+        end = bisect_left(entries, (high,)) if high is not None else len(entries)
+        return start, max(start, end)
+
+    @staticmethod
+    def _ids_between(entries, start, end):
+        for i in range(start, end):
+            yield entries[i][1]
+
+    def _append(self, records):
+        """Write records to the log and apply them; caller holds the lock"""
+        if self._wal is None:
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        for seq, record in enumerate(records, self.seq + 1):
+            record['seq'] = seq
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        self._wal.write(data)
+        self.wal_bytes += len(data)  # json.dumps escapes non-ASCII, so characters are bytes
+        self._wal.flush()
+        if WAL_FSYNC:
+            os.fsync(self._wal.fileno())
+        for record in records:
+            self._apply(record)
+        self.wal_records += len(records)
+        self._ensure_compactor()
+        if self.wal_records >= max(COMPACT_MIN_RECORDS, len(self.todos) // 2):
+            self._wake.set()
+
+    # Reads return the live dicts; callers must not modify them
+
+    def list(self):
+        with self._lock:
+            return list(self.todos.values())
+
+    def get(self, todo_id):
+        return self.todos.get(todo_id)
+
+    def count(self):
+        return len(self.todos)
+
+    def query(self, status=None, priority=None, tag=None, overdue_before=None,
+              created_after=None, created_before=None, after=None, limit=None):
+        """Todos matching every given filter, in store order
+        
+        Candidates come from whichever index yields the fewest ids; the other
+        filters are then checked on those todos only, and only the page past
+        the cursor is kept and sorted. Returns (todos, total, next_cursor): at
+        most limit todos created after the cursor, how many match in all, and
+        the cursor for the next page or None on the last one.
+        """
+        def matches(todo):
+            if status is not None and self._status(todo) != status:
+                return False
+            if priority is not None and str(todo.get('priority', '')).lower() != priority.lower():
+                return False
+            if tag is not None and tag not in self._tags(todo):
+                return False
+            if overdue_before is not None:
+                due_date = todo.get('due_date')
+                if todo.get('completed', False) or not isinstance(due_date, str) or due_date >= overdue_before:
+                    return False
+            if created_after is not None or created_before is not None:
+                created_at = todo.get('created_at')
+                if not isinstance(created_at, str):
+                    return False
+                if created_after is not None and created_at < created_after:
+                    return False
+                if created_before is not None and created_at >= created_before:
+                    return False
+            return True
+        
+        with self._lock:
+            # (size, ids) for each index that applies; sorted ranges are read lazily
+            candidates = []
+            if status is not None:
+                ids = self.by_status.get(status, ())
+                candidates.append((len(ids), ids))
+            if priority is not None:
+                ids = self.by_priority.get(priority.lower(), ())
+                candidates.append((len(ids), ids))
+            if tag is not None:
+                ids = self.by_tag.get(tag, ())
+                candidates.append((len(ids), ids))
+            if overdue_before is not None:
+                start, end = self._between(self.open_due, high=overdue_before)
+                candidates.append((end - start, self._ids_between(self.open_due, start, end)))
+            if created_after is not None or created_before is not None:
+                start, end = self._between(self.created, created_after, created_before)
+                candidates.append((end - start, self._ids_between(self.created, start, end)))
+            if not candidates:
+                start = bisect_left(self.order, (after + 1,)) if after is not None else 0
+                end = min(start + limit, len(self.order)) if limit is not None else len(self.order)
+                todos = [self.todos[todo_id] for _, todo_id in self.order[start:end]]
+                next_cursor = self.order[end - 1][0] if end < len(self.order) else None
+                return todos, len(self.order), next_cursor
+            
+            size, ids = min(candidates, key=lambda candidate: candidate[0])
+            if len(candidates) == 1:
+                total = size
+            else:
+                ids = [todo_id for todo_id in ids if matches(self.todos[todo_id])]
+                total = len(ids)
+            
+            if limit is not None and total * PAGE_SCAN_RATIO >= len(self.order):
+                # Common matches: walk the store order from the cursor until the page is full
+                start = bisect_left(self.order, (after + 1,)) if after is not None else 0
+                entries = (self.order[i] for i in range(start, len(self.order))
+                           if matches(self.todos[self.order[i][1]]))
+                page = list(itertools.islice(entries, limit + 1))
+            else:
+                # Rare matches: keep only the page past the cursor, never sort them all
+                entries = ((self.created_seq[todo_id], todo_id) for todo_id in ids
+                           if matches(self.todos[todo_id]))
+                if after is not None:
+                    entries = (entry for entry in entries if entry[0] > after)
+                page = sorted(entries) if limit is None else heapq.nsmallest(limit + 1, entries)
+            
+            # One more than the page tells whether another page follows
+            next_cursor = None
+            if limit is not None and len(page) > limit:
+                page = page[:limit]
+                next_cursor = page[-1][0]
+            return [self.todos[todo_id] for _, todo_id in page], total, next_cursor
+
+    def counts(self, recent_since=None, overdue_before=None):
+        """Running totals from the index sizes, without scanning the todos"""
+        with self._lock:
+            counts = {
+                'total': len(self.todos),
+                'completed': len(self.by_status['completed']),
+                'pending': len(self.by_status['pending']),
+                'priorities': {priority: len(ids) for priority, ids in self.by_priority.items()}
+            }
+            if recent_since is not None:
+                start, end = self._between(self.created, low=recent_since)
+                counts['recent'] = end - start
+            if overdue_before is not None:
+                start, end = self._between(self.open_due, high=overdue_before)
+                counts['overdue'] = end - start
+            return counts
+
+    def changes(self, since, limit):
+        """Changes after seq since, oldest first, as (changes, has_more)
+        
+        Each todo appears once, with its current state: op is "create" if it
+        was created after since, "update" otherwise and "delete" for a
+        tombstone. Returns (None, False) if since is older than the
+        tombstones kept, meaning the caller has to fetch /todos again.
+        """
+        with self._lock:
+            if since < self.horizon:
+                return None, False
+            newer = []
+            for todo_id in reversed(self.changelog):
+                if self.changelog[todo_id] <= since:
+                    break
+                newer.append(todo_id)
+            newer.reverse()
+            
+            changes = []
+            for todo_id in newer[:limit]:
+                change = {"seq": self.changelog[todo_id], "id": todo_id}
+                todo = self.todos.get(todo_id)
+                if todo is None:
+                    change["op"] = "delete"
+                else:
+                    change["op"] = "create" if self.created_seq[todo_id] > since else "update"
+                    change["todo"] = todo
+                changes.append(change)
+            return changes, len(newer) > limit
+
+    # Writes
+
+    def create(self, todo):
+        return self.create_many([todo])[0]
+
+    def create_many(self, todos):
+        """Store new todos, giving each one without an id a fresh one"""
+        self.apply_batch([('create', todo.get('id'), todo) for todo in todos])
+        return todos
+
+    def update(self, todo_id, changes):
+        """Apply a dict of field changes; None if the todo does not exist"""
+        return self.apply_batch([('update', todo_id, changes)])[0]
+
+    def delete(self, todo_id):
+        return self.apply_batch([('delete', todo_id, None)])[0]
+
+    def apply_batch(self, operations):
+        """Apply (op, todo_id, value) operations under one lock and one log write
+        
+        op is 'create' with the new todo, 'update' with a dict of field changes
+        or 'delete' with None. A create with todo_id None gets a fresh id,
+        set on the todo. Operations see the effect of earlier ones in the
+        batch. Returns, per operation, the stored or deleted todo, or None if
+        an update or delete found no such todo.
+        """
+        results = []
+        with self._lock:
+            fresh_ids = iter(self._fresh_ids(sum(1 for op, todo_id, _ in operations
+                                                 if op == 'create' and todo_id is None)))
+            staged = {}  # todo_id -> todo, or None once deleted, within this batch
+            records = []
+            for op, todo_id, value in operations:
+                if op == 'create' and todo_id is None:
+                    todo_id = value['id'] = next(fresh_ids)
+                current = staged[todo_id] if todo_id in staged else self.todos.get(todo_id)
+                if op == 'create':
+                    staged[todo_id] = value
+                    records.append({'op': 'create', 'todo': value})
+                    results.append(value)
+                elif current is None:
+                    results.append(None)
+                elif op == 'update':
+                    todo = dict(current, **value)
+                    staged[todo_id] = todo
+                    records.append({'op': 'update', 'todo': todo})
+                    results.append(todo)
+                else:
+                    staged[todo_id] = None
+                    records.append({'op': 'delete', 'id': todo_id})
+                    results.append(current)
+            if records:
+                self._append(records)
+        return results
+
+    def _fresh_ids(self, count):
+        """count short random ids no todo uses; caller holds the lock
+        
+        Only ids that collide, with a todo or with each other, are redrawn.
+        """
+        ids = set()
+        while len(ids) < count:
+            raw = os.urandom(4 * (count - len(ids))).hex()
+            ids.update(todo_id for todo_id in (raw[i:i + 8] for i in range(0, len(raw), 8))
+                       if todo_id not in self.todos)
+        return list(ids)
+
+    def seed(self, todos):
+        """Replace everything with the given todos and snapshot them"""
+        with self._lock:
+            self.todos = {}
+            self._reset_indexes()
+            self.horizon = self.seq  # no tombstones for what was replaced
+            for todo in todos:
+                self._apply({'op': 'create', 'todo': todo})
+        self.compact(force=True)
+
+    # Compaction
+
+    def _ensure_compactor(self):
+        if self._compactor_pid == os.getpid() and self._compactor.is_alive():
+            return
+        self._compactor_pid = os.getpid()
+        self._compactor = threading.Thread(target=self._run_compactor, name='todo-compactor', daemon=True)
+        self._compactor.start()
+
+    def _run_compactor(self):
+        while True:
+            self._wake.wait(COMPACT_INTERVAL)
+            self._wake.clear()
+            try:
+                self.compact()
+            except OSError as e:
+                print(f"Todo snapshot compaction failed: {e}")
+
+    def compact(self, force=False):
+        """Snapshot the current state and discard the log records it covers"""
+        with self._compact_lock:
+            with self._lock:
+                if not self.wal_records and not force:
+                    return False
+                # New writes go to a fresh log while the snapshot is written
+                if self._wal is not None:
+                    self._wal.close()
+                    self._wal = None
+                if os.path.exists(self.wal_path):
+                    self._rotate_wal()
+                snapshot = {
+                    'seq': self.seq,
+                    'horizon': self.horizon,
+                    'todos': list(self.todos.values()),
+                    'versions': {todo_id: (self.created_seq[todo_id], self.changelog[todo_id])
+                                 for todo_id in self.todos},
+                    'tombstones': dict(self.tombstones)
+                }
+                self.wal_records = 0
+            
+            directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+            fd, temp_path = tempfile.mkstemp(prefix='.todos-', suffix='.json', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(snapshot, f, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.snapshot_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            if os.path.exists(self.wal_path + '.old'):
+                os.unlink(self.wal_path + '.old')
+            return True
+
+    def _rotate_wal(self):
+        """Move the live log aside; a rotated log left by a failed compaction keeps its records"""
+        old_path = self.wal_path + '.old'
+        if not os.path.exists(old_path):
+            os.replace(self.wal_path, old_path)
+        else:
+            with open(self.wal_path, 'rb') as src, open(old_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.unlink(self.wal_path)
+        self.wal_bytes = 0
+
+    def status(self):
+        return {
+            'todos': len(self.todos),
+            'seq': self.seq,
+            'tombstones': len(self.tombstones),
+            'wal_records': self.wal_records,
+            'wal_bytes': self.wal_bytes
+        }
+
+store = TodoStore(TODOS_FILE, WAL_FILE)
 
 # =============================================================================
 # API ENDPOINTS
@@ -44,82 +567,205 @@ def home():
         "endpoints": {
             "GET /": "API information",
             "GET /health": "Health check",
-            "GET /todos": "List all todos",
+            "GET /todos": "List todos (filters, limit/cursor paging, fields, stream=json|ndjson)",
             "POST /todos": "Create new todo",
             "GET /todos/{id}": "Get specific todo",
             "PUT /todos/{id}": "Update todo",
             "DELETE /todos/{id}": "Delete todo",
+            "GET /todos/changes": "Todos changed since ?since=<seq>",
             "GET /stats": "Todo statistics"
         },
-        "total_todos": len(load_todos()),
+        "total_todos": store.count(),
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    todos = load_todos()
+    counts = store.counts()
     return jsonify({
         "status": "healthy",
         "service": "todo-api",
-        "total_todos": len(todos),
-        "completed_todos": len([t for t in todos if t.get('completed', False)]),
+        "total_todos": counts['total'],
+        "completed_todos": counts['completed'],
+        "storage": store.status(),
         "timestamp": datetime.now().isoformat()
     })
 
 @app.route('/todos', methods=['GET'])
 def get_todos():
-    """Get all todos with optional filtering"""
-    todos = load_todos()
+    """Get all todos with optional filtering
     
+    Carries a weak ETag of the change sequence, so If-None-Match gets a 304
+    until any todo changes. The overdue filter also depends on the date, so
+    its ETag includes today's date and goes stale at midnight.
+    """
     # Optional query parameters
     status = request.args.get('status')  # completed, pending
     priority = request.args.get('priority')  # high, medium, low
+    tag = request.args.get('tag')
+    overdue = request.args.get('overdue', 'false').lower() == 'true'
+    created_after = request.args.get('created_after')  # ISO date or datetime, inclusive
+    created_before = request.args.get('created_before')  # exclusive
+    
+    # Compare in the same isoformat the todos are stored in
+    try:
+        created_after = datetime.fromisoformat(created_after).isoformat() if created_after else None
+        created_before = datetime.fromisoformat(created_before).isoformat() if created_before else None
+    except ValueError:
+        return jsonify({"error": "created_after and created_before must be ISO dates"}), 400
+    
+    # Paging: cursor is the next_cursor of the previous page
+    fields = [field for field in request.args.get('fields', '').split(',') if field]
+    stream = request.args.get('stream')  # json, ndjson
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        cursor = int(request.args['cursor']) if 'cursor' in request.args else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    if stream not in (None, 'json', 'ndjson'):
+        return jsonify({"error": "stream must be 'json' or 'ndjson'"}), 400
+    
+    # Read before querying: a change racing the query is then re-sent, never missed
+    seq = store.seq
+    today = datetime.now().date().isoformat()
+    version = f'{seq}-{today}' if overdue else str(seq)
+    etag = f'W/"{version}"'
+    if request.if_none_match.contains_weak(version):
+        return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+    
+    filtered_todos, total, next_cursor = store.query(
+        status=status if status in ('completed', 'pending') else None,
+        priority=priority or None,
+        tag=tag or None,
+        overdue_before=today if overdue else None,
+        created_after=created_after,
+        created_before=created_before,
+        after=cursor,
+        limit=limit
+    )
+    
+    filters_applied = {
+        "status": status,
+        "priority": priority,
+        "tag": tag,
+        "overdue": overdue,
+        "created_after": created_after,
+        "created_before": created_before
+    }
+    
+    if stream:
+        response = stream_todos(filtered_todos, fields, stream, {
+            "total": total,
+            "next_cursor": next_cursor,
+            "seq": seq,
+            "filters_applied": filters_applied,
+            "timestamp": datetime.now().isoformat()
+        })
+    else:
+        if fields:
+            filtered_todos = [project_todo(todo, fields) for todo in filtered_todos]
+        
+        response = jsonify({
+            "todos": filtered_todos,
+            "total": total,
+            "count": len(filtered_todos),
+            "next_cursor": next_cursor,
+            "seq": seq,
+            "filters_applied": filters_applied,
+            "timestamp": datetime.now().isoformat()
+        })
     
-    filtered_todos = todos
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/todos/changes')
+def get_changes():
+    """Creates, updates and deletes after a change sequence number
     
-    # Filter by completion status
-    if status == 'completed':
-        filtered_todos = [t for t in filtered_todos if t.get('completed', False)]
-    elif status == 'pending':
-        filtered_todos = [t for t in filtered_todos if not t.get('completed', False)]
+    Start from the seq returned by /todos, then pass each response's
+    next_since. 410 means deletions that far back are no longer tracked and
+    the client should fetch /todos again.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
     
-    # Filter by priority
-    if priority:
-        filtered_todos = [t for t in filtered_todos if t.get('priority', '').lower() == priority.lower()]
+    changes, has_more = store.changes(since, limit)
+    if changes is None:
+        return jsonify({
+            "error": "Changes since this seq are no longer available, fetch /todos again",
+            "oldest_since": store.horizon
+        }), 410
     
     return jsonify({
-        "todos": filtered_todos,
-        "total": len(filtered_todos),
-        "filters_applied": {
-            "status": status,
-            "priority": priority
-        },
+        "changes": changes,
+        "next_since": changes[-1]['seq'] if changes else since,
+        "has_more": has_more,
+        "seq": store.seq,
         "timestamp": datetime.now().isoformat()
     })
 
-@app.route('/todos', methods=['POST'])
-def create_todo():
-    """Create a new todo"""
-    data = request.get_json()
+def project_todo(todo, fields):
+    """Keep only the requested fields of a todo"""
+    return {field: todo[field] for field in fields if field in todo}
+
+def stream_todos(todos, fields, fmt, envelope):
+    """Stream a page of todos as a JSON document or as NDJSON
     
-    if not data or 'title' not in data:
-        return jsonify({"error": "Title is required"}), 400
+    Todos are serialized a chunk at a time as the response is written, so the
+    body is never held in memory. The JSON form wraps them in the usual
+    envelope; NDJSON sends one todo per line and the paging details as headers.
+    """
+    def chunks():
+        if fmt == 'json':
+            yield json.dumps(envelope)[:-1] + ',"todos":['
+        for start in range(0, len(todos), STREAM_CHUNK_TODOS):
+            chunk = todos[start:start + STREAM_CHUNK_TODOS]
+            if fields:
+                chunk = [project_todo(todo, fields) for todo in chunk]
+            if fmt == 'json':
+                yield (',' if start else '') + ','.join(json.dumps(todo) for todo in chunk)
+            else:
+                yield ''.join(json.dumps(todo) + '\n' for todo in chunk)
+        if fmt == 'json':
+            yield ']}'
     
-    # Validate title
-    if len(data['title'].strip()) == 0:
-        return jsonify({"error": "Title cannot be empty"}), 400
+    if fmt == 'json':
+        return Response(chunks(), mimetype='application/json')
+    headers = {'X-Total-Count': str(envelope['total'])}
+    if envelope['next_cursor'] is not None:
+        headers['X-Next-Cursor'] = str(envelope['next_cursor'])
+    return Response(chunks(), mimetype='application/x-ndjson', headers=headers)
+
+def build_todo(data, todo_id, now):
+    """A new todo from request data, or (None, error) if it is invalid
     
-    todos = load_todos()
+    todo_id may be None to let the store assign one.
+    """
+    if not isinstance(data, dict):
+        return None, "Each todo must be a JSON object"
+    title = data.get('title')
+    if not isinstance(title, str):
+        return None, "Title is required"
+    if len(title.strip()) == 0:
+        return None, "Title cannot be empty"
     
     new_todo = {
-        "id": str(uuid.uuid4())[:8],  # Short UUID
-        "title": data['title'].strip(),
-        "description": data.get('description', '').strip(),
+        "id": todo_id,
+        "title": title.strip(),
+        "description": str(data.get('description') or '').strip(),
         "completed": False,
-        "priority": data.get('priority', 'medium').lower(),
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat(),
+        "priority": str(data.get('priority') or 'medium').lower(),
+        "created_at": now,
+        "updated_at": now,
         "due_date": data.get('due_date'),
         "tags": data.get('tags', [])
     }
@@ -128,8 +774,51 @@ def create_todo():
     if new_todo['priority'] not in ['low', 'medium', 'high']:
         new_todo['priority'] = 'medium'
     
-    todos.append(new_todo)
-    save_todos(todos)
+    return new_todo, None
+
+def todo_changes(data, now):
+    """The field changes requested by update data, or (None, error)"""
+    changes = {}
+    
+    # Update fields if provided
+    if 'title' in data:
+        if not isinstance(data['title'], str) or len(data['title'].strip()) == 0:
+            return None, "Title cannot be empty"
+        changes['title'] = data['title'].strip()
+    
+    if 'description' in data:
+        changes['description'] = str(data['description'] or '').strip()
+    
+    if 'completed' in data:
+        changes['completed'] = bool(data['completed'])
+    
+    if 'priority' in data:
+        priority = str(data['priority']).lower()
+        if priority in ['low', 'medium', 'high']:
+            changes['priority'] = priority
+    
+    if 'due_date' in data:
+        changes['due_date'] = data['due_date']
+    
+    if 'tags' in data:
+        changes['tags'] = data['tags'] if isinstance(data['tags'], list) else []
+    
+    changes['updated_at'] = now
+    return changes, None
+
+@app.route('/todos', methods=['POST'])
+def create_todo():
+    """Create a new todo"""
+    data = request.get_json()
+    
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Title is required"}), 400
+    
+    new_todo, error = build_todo(data, None, datetime.now().isoformat())
+    if error:
+        return jsonify({"error": error}), 400
+    
+    store.create(new_todo)
     
     return jsonify({
         "message": "Todo created successfully",
@@ -139,7 +828,7 @@ def create_todo():
 @app.route('/todos/<todo_id>', methods=['GET'])
 def get_todo(todo_id):
     """Get a specific todo by ID"""
-    todo = find_todo_by_id(todo_id)
+    todo = store.get(todo_id)
     
     if not todo:
         return jsonify({"error": "Todo not found"}), 404
@@ -154,44 +843,19 @@ def update_todo(todo_id):
     """Update a specific todo"""
     data = request.get_json()
     
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({"error": "No data provided"}), 400
     
-    todos = load_todos()
-    todo_index = next((i for i, todo in enumerate(todos) if todo['id'] == todo_id), None)
-    
-    if todo_index is None:
+    if store.get(todo_id) is None:
         return jsonify({"error": "Todo not found"}), 404
     
-    todo = todos[todo_index]
-    
-    # Update fields if provided
-    if 'title' in data:
-        if len(data['title'].strip()) == 0:
-            return jsonify({"error": "Title cannot be empty"}), 400
-        todo['title'] = data['title'].strip()
-    
-    if 'description' in data:
-        todo['description'] = data['description'].strip()
-    
-    if 'completed' in data:
-        todo['completed'] = bool(data['completed'])
-    
-    if 'priority' in data:
-        priority = data['priority'].lower()
-        if priority in ['low', 'medium', 'high']:
-            todo['priority'] = priority
-    
-    if 'due_date' in data:
-        todo['due_date'] = data['due_date']
+    changes, error = todo_changes(data, datetime.now().isoformat())
+    if error:
+        return jsonify({"error": error}), 400
     
-    if 'tags' in data:
-        todo['tags'] = data['tags'] if isinstance(data['tags'], list) else []
-    
-    todo['updated_at'] = datetime.now().isoformat()
-    
-    todos[todo_index] = todo
-    save_todos(todos)
+    todo = store.update(todo_id, changes)
+    if todo is None:
+        return jsonify({"error": "Todo not found"}), 404
     
     return jsonify({
         "message": "Todo updated successfully",
@@ -201,15 +865,11 @@ def update_todo(todo_id):
 @app.route('/todos/<todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
     """Delete a specific todo"""
-    todos = load_todos()
-    todo_index = next((i for i, todo in enumerate(todos) if todo['id'] == todo_id), None)
+    deleted_todo = store.delete(todo_id)
     
-    if todo_index is None:
+    if deleted_todo is None:
         return jsonify({"error": "Todo not found"}), 404
     
-    deleted_todo = todos.pop(todo_index)
-    save_todos(todos)
-    
     return jsonify({
         "message": "Todo deleted successfully",
         "deleted_todo": {
@@ -221,23 +881,18 @@ def delete_todo(todo_id):
 @app.route('/stats')
 def get_stats():
     """Get todo statistics"""
-    todos = load_todos()
+    # Recent activity (todos created in last 7 days)
+    seven_days_ago = datetime.now() - timedelta(days=7)
+    counts = store.counts(recent_since=seven_days_ago.isoformat(),
+                          overdue_before=datetime.now().date().isoformat())
     
-    total = len(todos)
-    completed = len([t for t in todos if t.get('completed', False)])
-    pending = total - completed
+    total = counts['total']
+    completed = counts['completed']
+    pending = counts['pending']
     
     # Priority breakdown
-    priorities = {'high': 0, 'medium': 0, 'low': 0}
-    for todo in todos:
-        priority = todo.get('priority', 'medium')
-        if priority in priorities:
-            priorities[priority] += 1
-    
-    # Recent activity (todos created in last 7 days)
-    from datetime import timedelta
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    recent = len([t for t in todos if datetime.fromisoformat(t.get('created_at', '1970-01-01T00:00:00')) > seven_days_ago])
+    priorities = {priority: counts['priorities'].get(priority, 0) for priority in ('high', 'medium', 'low')}
+    recent = counts['recent']
     
     return jsonify({
         "total_todos": total,
@@ -246,6 +901,7 @@ def get_stats():
         "completion_rate": round((completed / total * 100) if total > 0 else 0, 1),
         "priority_breakdown": priorities,
         "recent_todos": recent,
+        "overdue_todos": counts['overdue'],
         "service": "todo-api",
         "timestamp": datetime.now().isoformat()
     })
@@ -253,70 +909,163 @@ def get_stats():
 @app.route('/todos/complete/<todo_id>', methods=['POST'])
 def complete_todo(todo_id):
     """Mark a todo as completed"""
-    todos = load_todos()
-    todo_index = next((i for i, todo in enumerate(todos) if todo['id'] == todo_id), None)
+    now = datetime.now().isoformat()
+    todo = store.update(todo_id, {'completed': True, 'updated_at': now, 'completed_at': now})
     
-    if todo_index is None:
+    if todo is None:
         return jsonify({"error": "Todo not found"}), 404
     
-    todos[todo_index]['completed'] = True
-    todos[todo_index]['updated_at'] = datetime.now().isoformat()
-    todos[todo_index]['completed_at'] = datetime.now().isoformat()
-    
-    save_todos(todos)
-    
     return jsonify({
         "message": "Todo marked as completed",
-        "todo": todos[todo_index]
+        "todo": todo
     })
 
+# =============================================================================
+# BULK OPERATIONS
+# =============================================================================
+
+def ndjson_lines(stream, chunk_size=65536):
+    """Split a request body into lines, reading it in chunks rather than per line"""
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+def read_ndjson():
+    """Yield (line_number, item, error) for each non-blank line of the request body"""
+    for line_number, line in enumerate(ndjson_lines(request.stream), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+            continue
+        if not isinstance(item, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, item, None
+
+def run_bulk(op, status, prepare):
+    """Validate NDJSON rows, apply the valid ones as one batch and stream the results
+    
+    prepare(item, now) returns (todo_id, value, error) for one row; create rows get
+    their ids from the store. The response is NDJSON with one result per input row, in
+    order, followed by a summary line.
+    """
+    now = datetime.now().isoformat()
+    rows = []
+    for line_number, item, error in read_ndjson():
+        todo_id, value = None, None
+        if error is None:
+            todo_id, value, error = prepare(item, now)
+        rows.append([line_number, todo_id, value, error])
+        if len(rows) > BULK_MAX_ITEMS:
+            return jsonify({"error": f"Maximum {BULK_MAX_ITEMS} todos per bulk request"}), 400
+    
+    valid = [row for row in rows if row[3] is None]
+    results = iter(store.apply_batch([(op, row[1], row[2]) for row in valid]))
+    
+    def lines():
+        summary = {status: 0, 'not_found': 0, 'invalid': 0}
+        for start in range(0, len(rows), STREAM_CHUNK_TODOS):
+            chunk = []
+            for line_number, todo_id, _, error in rows[start:start + STREAM_CHUNK_TODOS]:
+                result = {"line": line_number, "id": todo_id}
+                if error is not None:
+                    result.update(status='invalid', error=error)
+                else:
+                    todo = next(results)
+                    result['status'] = status if todo is not None else 'not_found'
+                    if op == 'create':
+                        result.update(id=todo['id'], todo=todo)
+                summary[result['status']] += 1
+                chunk.append(json.dumps(result) + '\n')
+            yield ''.join(chunk)
+        yield json.dumps({"summary": summary, "total_todos": store.count()}) + '\n'
+    
+    return Response(lines(), mimetype='application/x-ndjson')
+
+def create_row(item, now):
+    todo, error = build_todo(item, None, now)
+    return None, todo, error
+
+def update_row(item, now):
+    if not isinstance(item.get('id'), str):
+        return None, None, "id is required"
+    changes, error = todo_changes(item, now)
+    return item['id'], changes, error
+
+def complete_row(item, now):
+    if not isinstance(item.get('id'), str):
+        return None, None, "id is required"
+    return item['id'], {'completed': True, 'updated_at': now, 'completed_at': now}, None
+
+def delete_row(item, now):
+    if not isinstance(item.get('id'), str):
+        return None, None, "id is required"
+    return item['id'], None, None
+
 @app.route('/todos/bulk', methods=['POST'])
 def bulk_create_todos():
-    """Create multiple todos at once"""
+    """Create multiple todos at once
+    
+    Takes {"todos": [...]} as JSON, or one todo per line with an
+    application/x-ndjson body, which streams back a result per line.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        return run_bulk('create', 'created', create_row)
+    
     data = request.get_json()
     
-    if not data or 'todos' not in data or not isinstance(data['todos'], list):
+    if not isinstance(data, dict) or not isinstance(data.get('todos'), list):
         return jsonify({"error": "Provide 'todos' array"}), 400
     
-    if len(data['todos']) > 50:
-        return jsonify({"error": "Maximum 50 todos per bulk request"}), 400
+    if len(data['todos']) > BULK_MAX_ITEMS:
+        return jsonify({"error": f"Maximum {BULK_MAX_ITEMS} todos per bulk request"}), 400
     
-    todos = load_todos()
+    now = datetime.now().isoformat()
     created_todos = []
     
     for todo_data in data['todos']:
-        if 'title' not in todo_data or len(todo_data['title'].strip()) == 0:
+        new_todo, error = build_todo(todo_data, None, now)
+        if error:
             continue  # Skip invalid todos
-        
-        new_todo = {
-            "id": str(uuid.uuid4())[:8],
-            "title": todo_data['title'].strip(),
-            "description": todo_data.get('description', '').strip(),
-            "completed": False,
-            "priority": todo_data.get('priority', 'medium').lower(),
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "due_date": todo_data.get('due_date'),
-            "tags": todo_data.get('tags', [])
-        }
-        
-        if new_todo['priority'] not in ['low', 'medium', 'high']:
-            new_todo['priority'] = 'medium'
-        
-        todos.append(new_todo)
         created_todos.append(new_todo)
     
-    save_todos(todos)
+    # One log append for the whole batch
+    store.create_many(created_todos)
     
     return jsonify({
         "message": f"Created {len(created_todos)} todos",
         "created_todos": created_todos,
-        "total_todos": len(todos)
+        "total_todos": store.count()
     }), 201
 
+@app.route('/todos/bulk/update', methods=['POST'])
+def bulk_update_todos():
+    """Update todos from NDJSON lines of {"id": ..., <fields>}"""
+    return run_bulk('update', 'updated', update_row)
+
+@app.route('/todos/bulk/complete', methods=['POST'])
+def bulk_complete_todos():
+    """Mark todos completed from NDJSON lines of {"id": ...}"""
+    return run_bulk('update', 'completed', complete_row)
+
+@app.route('/todos/bulk/delete', methods=['POST'])
+def bulk_delete_todos():
+    """Delete todos from NDJSON lines of {"id": ...}"""
+    return run_bulk('delete', 'deleted', delete_row)
+
 if __name__ == '__main__':
-    # Initialize with sample data if file doesn't exist
-    if not os.path.exists(TODOS_FILE):
+    # Initialize with sample data if there is no stored data yet
+    if not os.path.exists(TODOS_FILE) and not os.path.exists(WAL_FILE):
         sample_todos = [
             {
                 "id": "todo001",
@@ -351,20 +1100,23 @@ if __name__ == '__main__':
                 "tags": ["monitoring", "dashboard"]
             }
         ]
-        save_todos(sample_todos)
+        store.seed(sample_todos)
     
     print("📝 Todo API starting...")
     print("🚀 Service: Simple Todo/Task Management")
     print("📍 Available endpoints:")
     print("   GET  /           - API information")
     print("   GET  /health     - Health check")
-    print("   GET  /todos      - List todos (supports ?status=completed&priority=high)")
+    print("   GET  /todos      - List todos (supports ?status=completed&priority=high&tag=api&overdue=true)")
+    print("                      paged with ?limit=100&cursor=..., ?fields=id,title and ?stream=json|ndjson")
     print("   POST /todos      - Create new todo")
+    print("   GET  /todos/changes - Creates, updates and deletes since ?since=<seq>")
     print("   GET  /todos/{id} - Get specific todo")
     print("   PUT  /todos/{id} - Update todo") 
     print("   DELETE /todos/{id} - Delete todo")
     print("   POST /todos/complete/{id} - Mark as completed")
-    print("   POST /todos/bulk - Create multiple todos")
+    print("   POST /todos/bulk - Create multiple todos (JSON, or NDJSON with per-line results)")
+    print("   POST /todos/bulk/update|complete|delete - NDJSON lines of {\"id\": ...}")
     print("   GET  /stats      - Todo statistics")
     print()
     print("🌐 API running on http://0.0.0.0:4000")
@@ -1,14 +1,42 @@
 # Enhanced app.py with Real-time Monitoring Features
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, Response
 from functools import wraps
 import json
 import os
 import subprocess
 import time
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import sqlite3
+import base64
+import hashlib
+import re
+import tempfile
+import gzip
+import zlib
+import csv
+import io
+import difflib
+import uuid
+import bisect
+from collections import deque, OrderedDict
 import threading
+import queue
+import atexit
+import heapq
+import random
+import mmap
+import struct
+import fcntl
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from array import array
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # request window analytics fall back to pure Python
+    np = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-in-production'
@@ -23,22 +51,137 @@ USERS = {
 # Configuration paths
 CONFIG_PATH = '/app/config/krakend.json'
 BACKUP_DIR = '/workspace/management/backups'
+DB_PATH = 'request_logs.db'
+
+# Config backup store: every BACKUP_CHECKPOINT_EVERY-th stored snapshot is a full
+# copy, the rest are diffs against the previous one. Retention is by count and,
+# when BACKUP_RETENTION_DAYS > 0, by age.
+BACKUP_CHECKPOINT_EVERY = int(os.environ.get('BACKUP_CHECKPOINT_EVERY', 20))
+BACKUP_RETENTION_COUNT = int(os.environ.get('BACKUP_RETENTION_COUNT', 1000))
+BACKUP_RETENTION_DAYS = float(os.environ.get('BACKUP_RETENTION_DAYS', 0))
+
+# Gateway restarts run as jobs: requests arriving within RESTART_DEBOUNCE seconds
+# of each other share one restart, which waits at most RESTART_MAX_WAIT seconds
+RESTART_DEBOUNCE = float(os.environ.get('RESTART_DEBOUNCE', 3.0))
+RESTART_MAX_WAIT = float(os.environ.get('RESTART_MAX_WAIT', 15.0))
+RESTART_TIMEOUT = float(os.environ.get('RESTART_TIMEOUT', 120.0))
+RESTART_ON_CONFIG_CHANGE = os.environ.get('RESTART_ON_CONFIG_CHANGE', 'false').lower() == 'true'
+RESTART_JOB_HISTORY = 200
+# Multi-worker mode: how often the leader looks for jobs queued by any worker
+RESTART_POLL_INTERVAL = float(os.environ.get('RESTART_POLL_INTERVAL', 0.5))
+
+# KrakenD access log ingestion; the gateway's stdout (server/logger) must be
+# written to this file, e.g. through the ./logs volume shared with the gateway
+KRAKEND_LOG_INGEST = os.environ.get('KRAKEND_LOG_INGEST', 'true').lower() == 'true'
+KRAKEND_LOG_PATH = os.environ.get('KRAKEND_LOG_PATH', '/var/log/krakend/krakend.log')
+KRAKEND_LOG_POLL = float(os.environ.get('KRAKEND_LOG_POLL', 1.0))
+KRAKEND_LOG_CHUNK = 4 * 1024 * 1024
+
+# Background request log writer settings
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 500))
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', 1.0))
+LOG_BACKPRESSURE = os.environ.get('LOG_BACKPRESSURE', 'drop')  # 'drop' or 'block'
+LOG_BLOCK_TIMEOUT = float(os.environ.get('LOG_BLOCK_TIMEOUT', 0.5))
+
+# Request log query page sizes
+LOG_PAGE_SIZE = 50
+LOG_MAX_PAGE_SIZE = 500
+
+# Rows read per query while streaming an export
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 5000))
+
+# Latency histogram bucket upper bounds (ms) used by the request rollups;
+# the extra last bucket holds everything slower than the final bound
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+HISTOGRAM_COLUMNS = [f'b{i}' for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+
+# Prometheus exposition settings; set METRICS_TOKEN to require a bearer token on /metrics
+METRICS_CACHE_TTL = float(os.environ.get('METRICS_CACHE_TTL', 2.0))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Server-Sent Events stream: events are coalesced per tick and the last
+# SSE_HISTORY ticks are kept so reconnecting dashboards can resume
+SSE_TICK = float(os.environ.get('SSE_TICK', 1.0))
+SSE_HISTORY = int(os.environ.get('SSE_HISTORY', 300))
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15.0))
+
+# Backend health probing
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', 5.0))
+# Threads for the scheduler's probes; a manual sweep uses one thread per host,
+# up to its own maximum
+HEALTH_SWEEP_WORKERS = int(os.environ.get('HEALTH_SWEEP_WORKERS', 32))
+HEALTH_SWEEP_MAX_WORKERS = int(os.environ.get('HEALTH_SWEEP_MAX_WORKERS', 256))
+
+# Scheduled prober: each host starts at the base interval, backs off towards the
+# max while it stays healthy and drops to the min while failing or flapping
+HEALTH_SCHEDULER_ENABLED = os.environ.get('HEALTH_SCHEDULER_ENABLED', 'true').lower() == 'true'
+HEALTH_PROBE_PATH = os.environ.get('HEALTH_PROBE_PATH', '')
+HEALTH_BASE_INTERVAL = float(os.environ.get('HEALTH_BASE_INTERVAL', 30))
+HEALTH_MIN_INTERVAL = float(os.environ.get('HEALTH_MIN_INTERVAL', 5))
+HEALTH_MAX_INTERVAL = float(os.environ.get('HEALTH_MAX_INTERVAL', 300))
+HEALTH_BACKOFF_FACTOR = 1.5
+HEALTH_JITTER = 0.1
+HEALTH_CONFIG_REFRESH = float(os.environ.get('HEALTH_CONFIG_REFRESH', 30))
+
+# Backend pools: a host failing POOL_EJECT_FAILURES probes in a row leaves every
+# multi-host pool it is in (never below POOL_MIN_HOSTS); it returns after
+# POOL_READMIT_SUCCESSES good probes and at least POOL_MIN_EJECTION seconds out
+POOL_EJECTION_ENABLED = os.environ.get('POOL_EJECTION_ENABLED', 'true').lower() == 'true'
+POOL_EJECT_FAILURES = int(os.environ.get('POOL_EJECT_FAILURES', 3))
+POOL_READMIT_SUCCESSES = int(os.environ.get('POOL_READMIT_SUCCESSES', 5))
+POOL_MIN_EJECTION = float(os.environ.get('POOL_MIN_EJECTION', 60))
+POOL_MIN_HOSTS = max(int(os.environ.get('POOL_MIN_HOSTS', 1)), 1)
+POOL_CHECK_INTERVAL = float(os.environ.get('POOL_CHECK_INTERVAL', 5))
 
-# Request metrics storage (in-memory for demo, use database in production)
-request_metrics = {
-    'total_requests': 0,
-    'successful_requests': 0,
-    'failed_requests': 0,
-    'avg_response_time': 0,
-    'recent_requests': []
+# Retention: raw request_logs/health_checks rows are kept for RETENTION_RAW_DAYS
+# (health checks are downsampled into hourly health_rollups first); request
+# rollups are kept per resolution. Maintenance deletes in batches of
+# MAINTENANCE_BATCH_ROWS with a pause in between and vacuums at most
+# MAINTENANCE_VACUUM_PAGES pages per run, so it never monopolizes the database.
+RETENTION_RAW_DAYS = float(os.environ.get('RETENTION_RAW_DAYS', 7))
+RETENTION_ROLLUP_DAYS = {
+    'minute': float(os.environ.get('RETENTION_MINUTE_ROLLUP_DAYS', 3)),
+    'hour': float(os.environ.get('RETENTION_HOUR_ROLLUP_DAYS', 90)),
+    'day': float(os.environ.get('RETENTION_DAY_ROLLUP_DAYS', 730))
 }
+RETENTION_HEALTH_ROLLUP_DAYS = float(os.environ.get('RETENTION_HEALTH_ROLLUP_DAYS', 365))
+MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL', 3600))
+MAINTENANCE_BATCH_ROWS = int(os.environ.get('MAINTENANCE_BATCH_ROWS', 5000))
+MAINTENANCE_BATCH_PAUSE = float(os.environ.get('MAINTENANCE_BATCH_PAUSE', 0.05))
+MAINTENANCE_MAX_ROWS_PER_RUN = int(os.environ.get('MAINTENANCE_MAX_ROWS_PER_RUN', 2000000))
+MAINTENANCE_VACUUM_PAGES = int(os.environ.get('MAINTENANCE_VACUUM_PAGES', 2000))
+
+# Buckets per service in one health history response: the automatic bucket
+# size aims for the default count, an explicit one may go up to the maximum
+HEALTH_HISTORY_DEFAULT_BUCKETS = int(os.environ.get('HEALTH_HISTORY_DEFAULT_BUCKETS', 150))
+HEALTH_HISTORY_MAX_BUCKETS = int(os.environ.get('HEALTH_HISTORY_MAX_BUCKETS', 1000))
+
+# Multi-worker mode (see gunicorn.conf.py): metric series and the recent-request
+# window live in this mmap-backed file so every worker reports fleet-wide numbers
+SHARED_STATE_PATH = os.environ.get('MANAGER_SHARED_STATE')
+SHARED_STATE_SLOTS = int(os.environ.get('MANAGER_SHARED_STATE_SLOTS', 4096))
+RECENT_REQUESTS_SIZE = 100
+
+# In-memory columnar window of the most recent requests behind /api/monitoring/analytics
+REQUEST_WINDOW_SIZE = int(os.environ.get('REQUEST_WINDOW_SIZE', 1000000))
+REQUEST_WINDOW_MAX_IDS = int(os.environ.get('REQUEST_WINDOW_MAX_IDS', 100000))
 
 # Database setup for request logging
 def init_database():
     """Initialize SQLite database for request logging"""
-    conn = sqlite3.connect('request_logs.db')
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # Incremental auto-vacuum lets maintenance return freed pages a few at a
+    # time. This takes effect for a new database; an existing one only switches
+    # after a full VACUUM, which is left to POST /api/maintenance/vacuum
+    # because it rewrites the whole file
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    
+    # WAL lets the log writer commit while dashboard queries are reading
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS request_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -63,12 +206,1086 @@ def init_database():
         )
     ''')
     
+    # Where the KrakenD log ingester stopped, committed with the rows it inserted
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_ingest_state (
+            path TEXT PRIMARY KEY,
+            inode INTEGER,
+            offset INTEGER,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Per-endpoint latency rollups at minute, hour and day resolution
+    histogram_columns = ',\n'.join(f'            {column} INTEGER NOT NULL DEFAULT 0' for column in HISTOGRAM_COLUMNS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS request_rollups (
+            resolution TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            request_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            total_response_time INTEGER NOT NULL DEFAULT 0,
+            min_response_time INTEGER,
+            max_response_time INTEGER,
+{histogram_columns},
+            PRIMARY KEY (resolution, bucket_start, endpoint)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_request_rollups_endpoint
+        ON request_rollups (resolution, endpoint, bucket_start)
+    ''')
+    
+    # Hourly health check aggregates that outlive the raw rows
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS health_rollups (
+            service_url TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            check_count INTEGER NOT NULL DEFAULT 0,
+            healthy_count INTEGER NOT NULL DEFAULT 0,
+            responded_count INTEGER NOT NULL DEFAULT 0,
+            total_response_time INTEGER NOT NULL DEFAULT 0,
+            min_response_time INTEGER,
+            max_response_time INTEGER,
+{histogram_columns},
+            errors TEXT,
+            PRIMARY KEY (service_url, bucket_start)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_health_checks_timestamp ON health_checks (timestamp)')
+    
+    # Hosts the pool manager took out of a backend's host list, with the full pool
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_ejections (
+            method TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            backend_index INTEGER NOT NULL,
+            host TEXT NOT NULL,
+            pool TEXT NOT NULL,
+            ejected_at REAL NOT NULL,
+            PRIMARY KEY (method, endpoint, backend_index, host)
+        )
+    ''')
+    
+    # Restart job records, so any worker can answer a status poll
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS restart_jobs (
+            id TEXT PRIMARY KEY,
+            requested_at TEXT,
+            job TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_health_checks_service_timestamp ON health_checks (service_url, timestamp)')
+    
+    # Live stream events exchanged between workers in multi-worker mode
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stream_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL
+        )
+    ''')
+    
+    # Indexes backing the keyset-paginated log query: equality filters use a
+    # (column, timestamp) index so filtered pages are still read in index
+    # order; range filters (endpoint prefix, status class) read the timestamp
+    # index and are checked per row (see build_log_filters)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_request_logs_timestamp ON request_logs (timestamp)')
+    for column in ('method', 'endpoint', 'status_code', 'client_ip', 'backend_url'):
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_request_logs_{column}_timestamp
+            ON request_logs ({column}, timestamp)
+        ''')
+    
     conn.commit()
     conn.close()
 
 # Initialize database on startup
 init_database()
 
+# ================================================================================
+# REQUEST ROLLUPS
+# ================================================================================
+
+ROLLUP_UPSERT_SQL = f'''
+    INSERT INTO request_rollups (
+        resolution, bucket_start, endpoint, request_count, error_count,
+        total_response_time, min_response_time, max_response_time, {', '.join(HISTOGRAM_COLUMNS)}
+    )
+    VALUES ({', '.join('?' * (8 + len(HISTOGRAM_COLUMNS)))})
+    ON CONFLICT (resolution, bucket_start, endpoint) DO UPDATE SET
+        request_count = request_count + excluded.request_count,
+        error_count = error_count + excluded.error_count,
+        total_response_time = total_response_time + excluded.total_response_time,
+        min_response_time = MIN(min_response_time, excluded.min_response_time),
+        max_response_time = MAX(max_response_time, excluded.max_response_time),
+        {', '.join(f'{column} = {column} + excluded.{column}' for column in HISTOGRAM_COLUMNS)}
+'''
+
+def new_rollup():
+    """[count, errors, total_ms, min_ms, max_ms, *histogram]"""
+    return [0, 0, 0, None, None] + [0] * len(HISTOGRAM_COLUMNS)
+
+def merge_rollup(target, source):
+    target[0] += source[0]
+    target[1] += source[1]
+    target[2] += source[2]
+    target[3] = source[3] if target[3] is None else min(target[3], source[3])
+    target[4] = source[4] if target[4] is None else max(target[4], source[4])
+    for i in range(5, len(target)):
+        target[i] += source[i]
+
+def fold_into_rollups(conn, rows):
+    """Fold request log rows into minute rollups, and those into hour and day rollups
+    
+    Runs inside the caller's transaction so rollups never drift from request_logs.
+    """
+    minutes = {}
+    for timestamp, method, endpoint, status_code, response_time, client_ip, backend_url in rows:
+        key = (timestamp[:16] + ':00', endpoint or '')
+        rollup = minutes.get(key)
+        if rollup is None:
+            rollup = minutes[key] = new_rollup()
+        response_time = response_time or 0
+        rollup[0] += 1
+        if status_code >= 400:
+            rollup[1] += 1
+        rollup[2] += response_time
+        rollup[3] = response_time if rollup[3] is None else min(rollup[3], response_time)
+        rollup[4] = response_time if rollup[4] is None else max(rollup[4], response_time)
+        rollup[5 + bisect.bisect_left(LATENCY_BUCKETS_MS, response_time)] += 1
+    
+    hours, days = {}, {}
+    for (minute, endpoint), rollup in minutes.items():
+        for derived, bucket_start in ((hours, minute[:13] + ':00:00'), (days, minute[:10] + ' 00:00:00')):
+            merge_rollup(derived.setdefault((bucket_start, endpoint), new_rollup()), rollup)
+    
+    upserts = []
+    for resolution, buckets in (('minute', minutes), ('hour', hours), ('day', days)):
+        for (bucket_start, endpoint), rollup in buckets.items():
+            upserts.append((resolution, bucket_start, endpoint, *rollup))
+    conn.executemany(ROLLUP_UPSERT_SQL, upserts)
+
+def histogram_percentile(histogram, total, quantile, lowest, highest):
+    """Estimate a percentile by interpolating inside the bucket that contains it"""
+    target = quantile * total
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            lower = max(LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0, lowest)
+            upper = min(LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else highest, highest)
+            return round(lower + (upper - lower) * (target - cumulative) / count, 1)
+        cumulative += count
+    return highest
+
+def summarize_rollup(rollup):
+    count, errors, total, lowest, highest = rollup[:5]
+    histogram = rollup[5:]
+    if not count:
+        return {'count': 0, 'error_count': 0, 'error_rate': 0, 'avg': None,
+                'min': None, 'max': None, 'p50': None, 'p95': None, 'p99': None}
+    return {
+        'count': count,
+        'error_count': errors,
+        'error_rate': round(errors / count * 100, 2),
+        'avg': round(total / count, 1),
+        'min': lowest,
+        'max': highest,
+        'p50': histogram_percentile(histogram, count, 0.50, lowest, highest),
+        'p95': histogram_percentile(histogram, count, 0.95, lowest, highest),
+        'p99': histogram_percentile(histogram, count, 0.99, lowest, highest)
+    }
+
+# ================================================================================
+# BACKGROUND REQUEST LOG WRITER
+# ================================================================================
+
+class RequestLogWriter:
+    """Queue request log rows and commit them in batches from one background thread"""
+
+    INSERT_SQL = '''
+        INSERT INTO request_logs (timestamp, method, endpoint, status_code, response_time, client_ip, backend_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, db_path, queue_size, batch_size, flush_interval, backpressure, block_timeout):
+        if backpressure not in ('drop', 'block'):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.db_path = db_path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {'enqueued': 0, 'dropped': 0, 'flushed': 0, 'batches': 0, 'errors': 0}
+        self._counter_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def _ensure_started(self):
+        """Start the writer thread lazily, and again in a forked worker process"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Rows queued in the parent belong to the parent's writer
+                self.queue = queue.Queue(maxsize=self.queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Queue one row; returns False when the row was dropped by backpressure"""
+        self._ensure_started()
+        try:
+            if self.backpressure == 'block':
+                self.queue.put(row, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(row)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('enqueued')
+        return True
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far has been committed"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self):
+        with self._counter_lock:
+            counters = dict(self.counters)
+        counters.update({
+            'queue_depth': self.queue.qsize(),
+            'queue_capacity': self.queue_size,
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'backpressure': self.backpressure
+        })
+        return counters
+
+    def _next_batch(self):
+        """Wait for a first row, then gather more until the batch is full or the interval ends"""
+        rows, waiters = [], []
+        try:
+            item = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return rows, waiters
+        
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if isinstance(item, threading.Event):
+                # A flush() caller wants everything before it committed now
+                waiters.append(item)
+                break
+            rows.append(item)
+            remaining = deadline - time.monotonic()
+            if len(rows) >= self.batch_size or remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return rows, waiters
+
+    def _write(self, conn, rows):
+        try:
+            with conn:
+                conn.executemany(self.INSERT_SQL, rows)
+                fold_into_rollups(conn, rows)
+            self._count('flushed', len(rows))
+            self._count('batches')
+        except sqlite3.Error as e:
+            self._count('errors')
+            print(f"Error flushing {len(rows)} request logs: {e}")
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        while True:
+            rows, waiters = self._next_batch()
+            if rows:
+                self._write(conn, rows)
+            for waiter in waiters:
+                waiter.set()
+
+request_log_writer = RequestLogWriter(
+    DB_PATH, LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL, LOG_BACKPRESSURE, LOG_BLOCK_TIMEOUT
+)
+atexit.register(request_log_writer.flush)
+
+# ================================================================================
+# LIVE EVENT BROADCASTER
+# ================================================================================
+
+class EventBroadcaster:
+    """Coalesce published events per tick and fan them out to every stream subscriber
+    
+    One producer thread turns whatever was published during a tick into a single
+    numbered event; subscribers only wait on a condition, so N open dashboards
+    share that one producer instead of each polling the database.
+    
+    With shared=True (multi-worker mode) each worker's producer writes its
+    tick's event to the stream_events table and reads back every worker's
+    new rows, so all subscribers see the same events under the same ids.
+    """
+
+    def __init__(self, tick, history_size, shared=False):
+        self.tick = tick
+        self.shared = shared
+        self.history = deque(maxlen=history_size)
+        self.last_id = 0
+        self.subscribers = 0
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self.shared:
+                self._load_shared_history()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='event-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _load_shared_history(self):
+        """Start from the fleet's latest events, so ids agree across workers"""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            rows = conn.execute('SELECT id, payload FROM stream_events ORDER BY id DESC LIMIT ?',
+                                (self.history.maxlen,)).fetchall()
+        finally:
+            conn.close()
+        with self._condition:
+            for row in reversed(rows):
+                if row[0] > self.last_id:
+                    self.history.append(row)
+                    self.last_id = row[0]
+
+    def _exchange(self, conn, pending):
+        """Store this worker's event, if any, and return everyone's events since last_id"""
+        with conn:
+            if pending:
+                event_id = conn.execute('INSERT INTO stream_events (payload) VALUES (?)',
+                                        (json.dumps(pending),)).lastrowid
+                conn.execute('DELETE FROM stream_events WHERE id <= ?', (event_id - self.history.maxlen,))
+        return conn.execute('SELECT id, payload FROM stream_events WHERE id > ? ORDER BY id',
+                            (self.last_id,)).fetchall()
+
+    def publish(self, kind, data):
+        """Queue an event of the given kind ('requests', 'health', ...) for the next tick"""
+        self._ensure_started()
+        with self._pending_lock:
+            self._pending.setdefault(kind, []).append(data)
+
+    def _run(self):
+        conn = sqlite3.connect(DB_PATH) if self.shared else None
+        while True:
+            time.sleep(self.tick)
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if self.shared:
+                try:
+                    events = self._exchange(conn, pending)
+                except sqlite3.Error as e:
+                    print(f"Error exchanging stream events: {e}")
+                    continue
+            elif pending:
+                events = [(self.last_id + 1, json.dumps(pending))]
+            else:
+                continue
+            if not events:
+                continue
+            with self._condition:
+                self.history.extend(events)
+                self.last_id = events[-1][0]
+                self._condition.notify_all()
+
+    def subscribe(self, last_event_id=None, heartbeat=SSE_HEARTBEAT):
+        """Yield SSE frames after last_event_id, or from now when no id is given"""
+        self._ensure_started()
+        with self._condition:
+            self.subscribers += 1
+            if last_event_id is None:
+                last_event_id = self.last_id
+            elif last_event_id > self.last_id:
+                # The id predates a restart; replay whatever history we have
+                last_event_id = 0
+        try:
+            yield f'retry: {int(self.tick * 1000) * 3}\n\n'
+            while True:
+                with self._condition:
+                    if self.last_id <= last_event_id:
+                        self._condition.wait(heartbeat)
+                    events = [event for event in self.history if event[0] > last_event_id]
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                for event_id, payload in events:
+                    yield f'id: {event_id}\nevent: update\ndata: {payload}\n\n'
+                last_event_id = events[-1][0]
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+event_broadcaster = EventBroadcaster(SSE_TICK, SSE_HISTORY, shared=SHARED_STATE_PATH is not None)
+
+# ================================================================================
+# SHARED WORKER STATE
+# ================================================================================
+
+class SharedState:
+    """Metric series and a recent-request ring in one mmap-backed file
+    
+    Each slot holds a series key (metric name and labels as JSON) and up to
+    SLOT_VALUES doubles. Every access holds flock() on the file plus a thread
+    lock, because one descriptor's flock doesn't exclude threads sharing it.
+    Workers reopen the file after fork, so each has its own lock; slot
+    positions found once are cached per process. gunicorn's post_fork does
+    that through after_fork() before any request thread exists; the
+    pid check in __enter__ covers other forks, serialized by _reopen_lock.
+    """
+    MAGIC = b'KDMGR001'
+    HEADER = struct.Struct('<8sIIQ')  # magic, slots used, unused, recent sequence
+    KEY_BYTES = 240
+    SLOT_VALUES = 16
+    SLOT = struct.Struct(f'<H{KEY_BYTES - 2}s{SLOT_VALUES}d')
+    RECENT_BYTES = 512
+    RECENT = struct.Struct(f'<QH{RECENT_BYTES - 10}s')
+
+    def __init__(self, path, slots, recent_size):
+        self.path = path
+        self.slots = slots
+        self.recent_size = recent_size
+        self.recent_offset = self.HEADER.size + slots * self.SLOT.size
+        self.size = self.recent_offset + recent_size * self.RECENT.size
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._slot_index = {}
+        self._thread_lock = threading.Lock()
+        self._reopen_lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != self.size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+            self._map = mmap.mmap(self._fd, self.size)
+            if self._map[:8] != self.MAGIC:
+                self.HEADER.pack_into(self._map, 0, self.MAGIC, 0, 0, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._slot_index = {}
+        self._thread_lock = threading.Lock()
+        # Set last: other threads skip the reopen only once everything above is in place
+        self._pid = os.getpid()
+
+    def after_fork(self):
+        """Give this process its own descriptor, mapping and locks"""
+        if self._pid == os.getpid():
+            return
+        with self._reopen_lock:
+            if self._pid != os.getpid():
+                self._open()
+
+    def __enter__(self):
+        self.after_fork()
+        self._thread_lock.acquire()
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def _find_slot(self, key, create):
+        index = self._slot_index.get(key)
+        if index is not None:
+            return index
+        used = self.HEADER.unpack_from(self._map, 0)[1]
+        for i in range(used):
+            length, raw = struct.unpack_from(f'<H{self.KEY_BYTES - 2}s', self._map, self.HEADER.size + i * self.SLOT.size)
+            self._slot_index[raw[:length]] = i
+        index = self._slot_index.get(key)
+        if index is None and create and used < self.slots:
+            index = used
+            self.SLOT.pack_into(self._map, self.HEADER.size + index * self.SLOT.size,
+                                len(key), key, *([0.0] * self.SLOT_VALUES))
+            struct.pack_into('<I', self._map, 8, used + 1)
+            self._slot_index[key] = index
+        return index
+
+    def add(self, name, labels, increments):
+        """Add (position, amount) increments to a series; False if it has no slot"""
+        key = json.dumps([name, list(labels)]).encode('utf-8')
+        if len(key) > self.KEY_BYTES - 2:
+            return False
+        with self:
+            index = self._find_slot(key, create=True)
+            if index is None:
+                return False
+            base = self.HEADER.size + index * self.SLOT.size + self.KEY_BYTES
+            for position, amount in increments:
+                offset = base + position * 8
+                struct.pack_into('<d', self._map, offset, struct.unpack_from('<d', self._map, offset)[0] + amount)
+            return True
+
+    def series(self, name, width):
+        """{labels: [values]} for every series of one metric"""
+        prefix = json.dumps([name])[:-1].encode('utf-8') + b', '
+        result = {}
+        with self:
+            used = self.HEADER.unpack_from(self._map, 0)[1]
+            for i in range(used):
+                length, raw, *values = self.SLOT.unpack_from(self._map, self.HEADER.size + i * self.SLOT.size)
+                if raw.startswith(prefix):
+                    labels = tuple(json.loads(raw[:length])[1])
+                    result[labels] = [int(v) if v.is_integer() else v for v in values[:width]]
+        return result
+
+    def append_recent(self, entry):
+        payload = json.dumps(entry).encode('utf-8')
+        if len(payload) > self.RECENT_BYTES - 10:
+            payload = json.dumps(dict(entry, endpoint=entry.get('endpoint', '')[:200])).encode('utf-8')[:self.RECENT_BYTES - 10]
+        with self:
+            sequence = struct.unpack_from('<Q', self._map, 16)[0] + 1
+            self.RECENT.pack_into(self._map, self.recent_offset + (sequence % self.recent_size) * self.RECENT.size,
+                                  sequence, len(payload), payload)
+            struct.pack_into('<Q', self._map, 16, sequence)
+
+    def recent(self):
+        """Recent entries from all workers, oldest first"""
+        with self:
+            latest = struct.unpack_from('<Q', self._map, 16)[0]
+            raw = [self.RECENT.unpack_from(self._map, self.recent_offset + (seq % self.recent_size) * self.RECENT.size)
+                   for seq in range(max(latest - self.recent_size + 1, 1), latest + 1)]
+        entries = []
+        for sequence, length, payload in raw:
+            try:
+                entries.append(json.loads(payload[:length]))
+            except ValueError:
+                continue  # truncated entry
+        return entries
+
+shared_state = SharedState(SHARED_STATE_PATH, SHARED_STATE_SLOTS, RECENT_REQUESTS_SIZE) if SHARED_STATE_PATH else None
+
+class FileLock:
+    """Exclusive lock across threads and, with a path, across worker processes
+    
+    Each acquisition takes the thread lock and then flock() on a freshly
+    opened descriptor of path, so it also works unchanged after fork.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self.path is None:
+            return self
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            os.close(self._fd)  # releases the flock
+            self._fd = None
+        self._thread_lock.release()
+
+def start_background_services_as_leader(lock_path):
+    """Run the background services in exactly one worker of a multi-worker fleet
+    
+    Every worker waits on an exclusive lock on lock_path; the holder starts
+    the services, and when it exits the OS releases the lock to the next one.
+    """
+    def wait_for_leadership():
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        print(f"Worker {os.getpid()} is running background services")
+        start_background_services()
+    
+    threading.Thread(target=wait_for_leadership, name='leader-election', daemon=True).start()
+
+# ================================================================================
+# REQUEST WINDOW
+# ================================================================================
+
+class StringInterner:
+    """Map strings to small integer ids; while max_ids are in use new values share one overflow id
+    
+    Ids are reference counted by the slots holding them, and an id whose
+    last slot was released is reused for the next new value.
+    """
+
+    def __init__(self, max_ids, overflow='(other)'):
+        self.max_ids = max_ids
+        self.ids = {overflow: 0}
+        self.values = [overflow]
+        self.refs = [0]
+        self.free = []
+
+    def intern(self, value):
+        value = value or ''
+        index = self.ids.get(value)
+        if index is None:
+            if self.free:
+                index = self.free.pop()
+                self.values[index] = value
+            elif len(self.values) < self.max_ids:
+                index = len(self.values)
+                self.values.append(value)
+                self.refs.append(0)
+            else:
+                index = 0
+            if index:
+                self.ids[value] = index
+        self.refs[index] += 1
+        return index
+
+    def release(self, index):
+        self.refs[index] -= 1
+        if index and not self.refs[index]:
+            del self.ids[self.values[index]]
+            self.free.append(index)
+
+def percentile(sorted_values, quantile):
+    """Linear-interpolated percentile of an ascending list (numpy's default method)"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+class RequestWindow:
+    """Fixed-capacity columnar ring of the most recent requests
+    
+    Timestamps, status codes and latencies are typed arrays; method, endpoint
+    and client are interned ids, freed again once no slot holds them. Appends
+    overwrite the oldest slot in O(1).
+    Analytics copy the live columns under the lock and then work on the copy,
+    vectorized with numpy when it is installed.
+    
+    With a db_path (multi-worker mode) the window ignores direct appends and
+    is filled by refresh() from the request_logs rows every worker and the
+    log ingester write, so each worker holds the same fleet-wide window.
+    """
+    COLUMNS = (('timestamp', 'd'), ('status', 'H'), ('latency', 'I'), ('method', 'H'), ('endpoint', 'I'),
+               ('client', 'I'))
+
+    def __init__(self, capacity, max_ids, db_path=None):
+        self.capacity = capacity
+        self.db_path = db_path
+        self.last_row_id = 0
+        self.count = 0
+        self.columns = {name: array(code, [0]) * capacity for name, code in self.COLUMNS}
+        self.methods = StringInterner(max_ids)
+        self.endpoints = StringInterner(max_ids)
+        self.clients = StringInterner(max_ids)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def scope(self):
+        return 'fleet' if self.db_path is not None else 'process'
+
+    def append(self, timestamp, method, endpoint, status_code, response_time, client_ip):
+        if self.db_path is None:
+            self._extend([(timestamp, method, endpoint, status_code, response_time, client_ip)])
+
+    def _extend(self, rows):
+        columns = self.columns
+        with self._lock:
+            for timestamp, method, endpoint, status_code, response_time, client_ip in rows:
+                i = self.count % self.capacity
+                if self.count >= self.capacity:
+                    self.methods.release(columns['method'][i])
+                    self.endpoints.release(columns['endpoint'][i])
+                    self.clients.release(columns['client'][i])
+                columns['timestamp'][i] = timestamp
+                columns['status'][i] = min(max(int(status_code or 0), 0), 65535)
+                columns['latency'][i] = min(max(int(response_time or 0), 0), 4294967295)
+                columns['method'][i] = self.methods.intern(method)
+                columns['endpoint'][i] = self.endpoints.intern(endpoint)
+                columns['client'][i] = self.clients.intern(client_ip)
+                self.count += 1
+
+    def refresh(self):
+        """Read request_logs rows added since the last refresh; the first call backfills the window"""
+        if self.db_path is None:
+            return
+        with self._refresh_lock:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                newest = conn.execute('SELECT MAX(id) FROM request_logs').fetchone()[0] or 0
+                cursor = conn.execute('''
+                    SELECT id, CAST(strftime('%s', timestamp) AS INTEGER), method, endpoint, status_code,
+                           response_time, client_ip
+                    FROM request_logs WHERE id > ? ORDER BY id
+                ''', (max(self.last_row_id, newest - self.capacity),))
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    self._extend(row[1:] for row in rows)
+                    self.last_row_id = rows[-1][0]
+            finally:
+                conn.close()
+
+    def latest(self, limit):
+        """The newest entries as dicts, oldest first"""
+        columns = self.columns
+        with self._lock:
+            start = max(self.count - limit, self.count - self.capacity, 0)
+            rows = []
+            for i in range(start, self.count):
+                i %= self.capacity
+                rows.append((columns['timestamp'][i], self.methods.values[columns['method'][i]],
+                             self.endpoints.values[columns['endpoint'][i]], columns['status'][i],
+                             columns['latency'][i], self.clients.values[columns['client'][i]]))
+        return [{'timestamp': datetime.fromtimestamp(ts).isoformat(), 'method': method, 'endpoint': endpoint,
+                 'status_code': status, 'response_time': latency, 'client_ip': client or None}
+                for ts, method, endpoint, status, latency, client in rows]
+
+    def snapshot(self, since=None):
+        """Copies of the filled columns (numpy arrays when available) and the id tables"""
+        with self._lock:
+            filled = min(self.count, self.capacity)
+            columns = {name: column[:filled] for name, column in self.columns.items()}
+            names = {'method': list(self.methods.values), 'endpoint': list(self.endpoints.values),
+                     'client': list(self.clients.values)}
+        
+        if np is not None:
+            columns = {name: np.frombuffer(column, dtype=column.typecode) for name, column in columns.items()}
+            if since is not None:
+                mask = columns['timestamp'] >= since
+                columns = {name: column[mask] for name, column in columns.items()}
+        elif since is not None:
+            keep = [i for i, ts in enumerate(columns['timestamp']) if ts >= since]
+            columns = {name: [column[i] for i in keep] for name, column in columns.items()}
+        else:
+            columns = {name: column.tolist() for name, column in columns.items()}
+        return columns, names
+
+    def summary(self, since=None):
+        columns, names = self.snapshot(since)
+        count = len(columns['latency'])
+        if not count:
+            return {'count': 0}
+        
+        if np is not None:
+            latency = columns['latency']
+            p50, p95, p99 = np.percentile(latency, [50, 95, 99]).tolist()
+            codes, counts = np.unique(columns['status'], return_counts=True)
+            statuses = dict(zip(codes.tolist(), counts.tolist()))
+            errors = int(np.count_nonzero(columns['status'] >= 400))
+            average = float(latency.mean())
+            oldest, newest = float(columns['timestamp'].min()), float(columns['timestamp'].max())
+        else:
+            latency = sorted(columns['latency'])
+            p50, p95, p99 = (percentile(latency, q) for q in (0.50, 0.95, 0.99))
+            statuses = {}
+            for status in columns['status']:
+                statuses[status] = statuses.get(status, 0) + 1
+            errors = sum(count for status, count in statuses.items() if status >= 400)
+            average = sum(latency) / count
+            oldest, newest = min(columns['timestamp']), max(columns['timestamp'])
+        
+        classes = {}
+        for status, status_count in statuses.items():
+            classes[f'{status // 100}xx'] = classes.get(f'{status // 100}xx', 0) + status_count
+        return {
+            'count': count,
+            'error_count': errors,
+            'error_rate': round(errors / count * 100, 2),
+            'avg': round(average, 1),
+            'p50': round(p50, 1),
+            'p95': round(p95, 1),
+            'p99': round(p99, 1),
+            'status_codes': {str(status): status_count for status, status_count in sorted(statuses.items())},
+            'status_classes': dict(sorted(classes.items())),
+            'oldest': datetime.fromtimestamp(oldest).isoformat(),
+            'newest': datetime.fromtimestamp(newest).isoformat()
+        }
+
+    def group_stats(self, key, since=None, with_percentiles=False):
+        """Per-id count, error count, latency sum/max (and p95) for one id column"""
+        columns, names = self.snapshot(since)
+        groups = {}
+        if np is not None and len(columns[key]):
+            ids = columns[key].astype(np.int64)
+            latency = columns['latency'].astype(np.float64)
+            counts = np.bincount(ids)
+            errors = np.bincount(ids, weights=columns['status'] >= 400)
+            sums = np.bincount(ids, weights=latency)
+            present = np.nonzero(counts)[0]
+            maxima = np.zeros(len(counts))
+            np.maximum.at(maxima, ids, latency)
+            p95s = {}
+            if with_percentiles:
+                order = np.lexsort((latency, ids))
+                sorted_ids, sorted_latency = ids[order], latency[order]
+                starts = np.searchsorted(sorted_ids, present)
+                ends = np.searchsorted(sorted_ids, present, side='right')
+                for group, start, end in zip(present.tolist(), starts.tolist(), ends.tolist()):
+                    p95s[group] = float(np.percentile(sorted_latency[start:end], 95))
+            for group in present.tolist():
+                groups[group] = {'count': int(counts[group]), 'errors': int(errors[group]),
+                                 'total': float(sums[group]), 'max': int(maxima[group]), 'p95': p95s.get(group)}
+        elif len(columns[key]):
+            latencies = {}
+            for group, status, latency in zip(columns[key], columns['status'], columns['latency']):
+                stats = groups.get(group)
+                if stats is None:
+                    stats = groups[group] = {'count': 0, 'errors': 0, 'total': 0, 'max': 0, 'p95': None}
+                stats['count'] += 1
+                stats['errors'] += status >= 400
+                stats['total'] += latency
+                stats['max'] = max(stats['max'], latency)
+                if with_percentiles:
+                    latencies.setdefault(group, []).append(latency)
+            for group, values in latencies.items():
+                groups[group]['p95'] = percentile(sorted(values), 0.95)
+        
+        span = 0
+        if len(columns['timestamp']):
+            timestamps = columns['timestamp']
+            newest = float(timestamps.max()) if np is not None else max(timestamps)
+            oldest = float(timestamps.min()) if np is not None else min(timestamps)
+            span = newest - (since if since is not None else oldest)
+        return {names[key][group]: stats for group, stats in groups.items()}, span
+
+request_window = RequestWindow(REQUEST_WINDOW_SIZE, REQUEST_WINDOW_MAX_IDS,
+                               db_path=DB_PATH if SHARED_STATE_PATH else None)
+
+# ================================================================================
+# METRICS REGISTRY
+# ================================================================================
+
+def format_metric_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_metric_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+class Metric:
+    """A labelled metric family; each family has its own lock
+    
+    With a shared state attached, updates go to its slots and snapshots read
+    them back, so every worker sees the whole fleet. Series that don't fit
+    there stay in the per-process values.
+    """
+    kind = 'untyped'
+    width = 1
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.shared = None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            values = {labels: (list(value) if isinstance(value, list) else value)
+                      for labels, value in self._values.items()}
+        if self.shared is not None:
+            for labels, series in self.shared.series(self.name, self.width).items():
+                if self.width == 1:
+                    values[labels] = values.get(labels, 0) + series[0]
+                elif labels in values:
+                    values[labels] = [a + b for a, b in zip(values[labels], series)]
+                else:
+                    values[labels] = series
+        return values
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in sorted(self.snapshot().items()):
+            lines.append(f'{self.name}{format_metric_labels(self.labelnames, labels)} {format_metric_value(value)}')
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        if self.shared is not None and self.shared.add(self.name, labels, ((0, amount),)):
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+class CallbackGauge(Metric):
+    """A metric whose samples are read from a function at render time"""
+
+    def __init__(self, name, help_text, labelnames, callback, kind='gauge'):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def snapshot(self):
+        return self.callback()
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames, buckets):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        self.width = len(self.buckets) + 3
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if self.shared is not None and \
+                self.shared.add(self.name, labels, ((index, 1), (self.width - 2, value), (self.width - 1, 1))):
+            return
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts, then sum and count
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        bounds = [format_metric_value(float(b)) for b in self.buckets] + ['+Inf']
+        for labels, series in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                label_text = format_metric_labels(self.labelnames, labels, [('le', bound)])
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = format_metric_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {format_metric_value(series[-2])}')
+            lines.append(f'{self.name}_count{label_text} {series[-1]}')
+        return lines
+
+class MetricsRegistry:
+    """Holds metric families and caches their rendered Prometheus text"""
+
+    def __init__(self, cache_ttl, shared=None):
+        self.cache_ttl = cache_ttl
+        self.shared = shared
+        self.metrics = []
+        self._cache = (0, '')
+        self._cache_lock = threading.Lock()
+
+    def register(self, metric):
+        # Callback and gauge samples are per process by nature
+        if isinstance(metric, (Counter, Histogram)) and metric.width <= SharedState.SLOT_VALUES:
+            metric.shared = self.shared
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        rendered_at, text = self._cache
+        if time.monotonic() - rendered_at < self.cache_ttl:
+            return text
+        with self._cache_lock:
+            rendered_at, text = self._cache
+            if time.monotonic() - rendered_at < self.cache_ttl:
+                return text
+            lines = []
+            for metric in self.metrics:
+                lines.extend(metric.render())
+            text = '\n'.join(lines) + '\n'
+            self._cache = (time.monotonic(), text)
+            return text
+
+metrics_registry = MetricsRegistry(METRICS_CACHE_TTL, shared_state)
+
+http_requests_total = metrics_registry.register(Counter(
+    'krakend_manager_http_requests_total',
+    'Requests handled by the management API',
+    ('route', 'method', 'status')
+))
+http_request_duration = metrics_registry.register(Histogram(
+    'krakend_manager_http_request_duration_seconds',
+    'Management API response time in seconds',
+    ('route', 'method'),
+    [b / 1000 for b in LATENCY_BUCKETS_MS]
+))
+metrics_registry.register(CallbackGauge(
+    'krakend_manager_log_writer_rows',
+    'Request log rows by outcome in the background writer',
+    ('outcome',),
+    lambda: {(outcome,): request_log_writer.stats()[outcome] for outcome in ('enqueued', 'dropped', 'flushed')},
+    kind='counter'
+))
+metrics_registry.register(CallbackGauge(
+    'krakend_manager_log_writer_queue_depth',
+    'Request log rows waiting to be written',
+    (),
+    lambda: {(): request_log_writer.queue.qsize()}
+))
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -77,39 +1294,32 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def log_request_to_db(method, endpoint, status_code, response_time, client_ip, backend_url=None):
-    """Log request to database"""
+def log_request_to_db(method, endpoint, status_code, response_time, client_ip, backend_url=None, route=None):
+    """Queue a request log row for the background writer and update metrics"""
     try:
-        conn = sqlite3.connect('request_logs.db')
-        cursor = conn.cursor()
+        # Same UTC format as CURRENT_TIMESTAMP, captured now rather than at flush time
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        request_log_writer.submit(
+            (timestamp, method, endpoint, status_code, response_time, client_ip, backend_url)
+        )
         
-        cursor.execute('''
-            INSERT INTO request_logs (method, endpoint, status_code, response_time, client_ip, backend_url)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (method, endpoint, status_code, response_time, client_ip, backend_url))
+        # Update in-memory metrics; route is the URL rule, so ids don't explode label cardinality
+        route = route or endpoint
+        http_requests_total.inc((route, method, str(status_code)))
+        http_request_duration.observe((route, method), (response_time or 0) / 1000)
         
-        conn.commit()
-        conn.close()
-        
-        # Update in-memory metrics
-        request_metrics['total_requests'] += 1
-        if status_code < 400:
-            request_metrics['successful_requests'] += 1
-        else:
-            request_metrics['failed_requests'] += 1
-            
-        # Add to recent requests (keep last 100)
-        request_metrics['recent_requests'].append({
+        entry = {
             'timestamp': datetime.now().isoformat(),
             'method': method,
             'endpoint': endpoint,
             'status_code': status_code,
             'response_time': response_time,
             'client_ip': client_ip
-        })
-        
-        if len(request_metrics['recent_requests']) > 100:
-            request_metrics['recent_requests'].pop(0)
+        }
+        request_window.append(time.time(), method, endpoint, status_code, response_time, client_ip)
+        if shared_state is not None:
+            shared_state.append_recent(entry)
+        event_broadcaster.publish('requests', entry)
             
     except Exception as e:
         print(f"Error logging request: {e}")
@@ -149,206 +1359,1666 @@ def auth_status():
 @require_auth
 def get_metrics():
     """Get real-time metrics for monitoring dashboard"""
+    total_requests = successful_requests = 0
+    for (route, method, status), count in http_requests_total.snapshot().items():
+        total_requests += count
+        if int(status) < 400:
+            successful_requests += count
+    
+    duration_sum = duration_count = 0
+    for series in http_request_duration.snapshot().values():
+        duration_sum += series[-2]
+        duration_count += series[-1]
+    
     return jsonify({
-        'total_requests': request_metrics['total_requests'],
-        'successful_requests': request_metrics['successful_requests'],
-        'failed_requests': request_metrics['failed_requests'],
-        'success_rate': (request_metrics['successful_requests'] / max(request_metrics['total_requests'], 1)) * 100,
-        'recent_requests': request_metrics['recent_requests'][-20:],  # Last 20 requests
+        'total_requests': total_requests,
+        'successful_requests': successful_requests,
+        'failed_requests': total_requests - successful_requests,
+        'success_rate': (successful_requests / max(total_requests, 1)) * 100,
+        'avg_response_time': round(duration_sum * 1000 / max(duration_count, 1), 1),
+        # Last 20 requests; across all workers in multi-worker mode
+        'recent_requests': shared_state.recent()[-20:] if shared_state is not None else request_window.latest(20),
+        'log_writer': request_log_writer.stats(),
+        'stream_subscribers': event_broadcaster.subscribers,
+        'fleet_wide': shared_state is not None,
+        'worker_pid': os.getpid(),
         'timestamp': datetime.now().isoformat()
     })
 
+def to_db_timestamp(value):
+    """Normalize an ISO timestamp to the UTC 'YYYY-MM-DD HH:MM:SS' form stored in SQLite"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def encode_log_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_log_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return str(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def build_log_filters(args):
+    """Translate request log query parameters into SQL clauses and parameters"""
+    clauses, params = [], []
+    
+    if args.get('method'):
+        clauses.append('method = ?')
+        params.append(args['method'].upper())
+    
+    # Ranges on the first column of a (column, timestamp) index would make
+    # SQLite sort every matching row for each page; the unary + keeps them off
+    # that index so pages and export chunks are read in timestamp order
+    if args.get('endpoint'):
+        prefix = args['endpoint']
+        clauses.append('+endpoint >= ? AND +endpoint < ?')
+        params.extend([prefix, prefix + '\uffff'])
+    
+    status = args.get('status')
+    if status:
+        if len(status) == 3 and status[0] in '12345' and status[1:].lower() == 'xx':
+            low = int(status[0]) * 100
+            clauses.append('+status_code BETWEEN ? AND ?')
+            params.extend([low, low + 99])
+        elif status.isdigit():
+            clauses.append('status_code = ?')
+            params.append(int(status))
+        else:
+            raise ValueError("status must be a code like 404 or a class like 5xx")
+    
+    for column in ('client_ip', 'backend_url'):
+        if args.get(column):
+            clauses.append(f'{column} = ?')
+            params.append(args[column])
+    
+    if args.get('since'):
+        clauses.append('timestamp >= ?')
+        params.append(to_db_timestamp(args['since']))
+    
+    if args.get('until'):
+        clauses.append('timestamp < ?')
+        params.append(to_db_timestamp(args['until']))
+    
+    return clauses, params
+
+@app.route('/api/monitoring/stream')
+@require_auth
+def monitoring_stream():
+    """Server-Sent Events feed of logged requests and health check results
+    
+    Each event carries everything published during one tick as
+    {"requests": [...], "health": [...]}. Browsers resume automatically
+    through the Last-Event-ID header; ?last_event_id= works as well.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    return Response(
+        event_broadcaster.subscribe(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of the metrics registry"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Invalid metrics token'}), 401
+    return app.response_class(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/monitoring/logs')
 @require_auth
 def get_request_logs():
-    """Get recent request logs"""
+    """Query request logs, newest first, with filters and keyset pagination
+    
+    Filters: method, endpoint (prefix), status (404 or 5xx), client_ip,
+    backend_url, since, until. Pass the returned next_cursor as ?cursor=
+    to fetch the following page.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', LOG_PAGE_SIZE)), 1), LOG_MAX_PAGE_SIZE)
+        clauses, params = build_log_filters(request.args)
+        
+        if request.args.get('cursor'):
+            timestamp, row_id = decode_log_cursor(request.args['cursor'])
+            clauses.append('(timestamp, id) < (?, ?)')
+            params.extend([timestamp, row_id])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
-        conn = sqlite3.connect('request_logs.db')
+        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
-        # Get last 50 requests
-        cursor.execute('''
-            SELECT timestamp, method, endpoint, status_code, response_time, client_ip, backend_url
-            FROM request_logs 
-            ORDER BY timestamp DESC 
-            LIMIT 50
-        ''')
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        cursor.execute(f'''
+            SELECT id, timestamp, method, endpoint, status_code, response_time, client_ip, backend_url
+            FROM request_logs
+            {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', params + [limit + 1])
+        rows = cursor.fetchall()
+        conn.close()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         
         logs = []
-        for row in cursor.fetchall():
+        for row in rows:
             logs.append({
-                'timestamp': row[0],
-                'method': row[1],
-                'endpoint': row[2],
-                'status_code': row[3],
-                'response_time': row[4],
-                'client_ip': row[5],
-                'backend_url': row[6]
+                'id': row[0],
+                'timestamp': row[1],
+                'method': row[2],
+                'endpoint': row[3],
+                'status_code': row[4],
+                'response_time': row[5],
+                'client_ip': row[6],
+                'backend_url': row[7]
             })
         
-        conn.close()
-        return jsonify({'logs': logs})
+        return jsonify({
+            'logs': logs,
+            'next_cursor': encode_log_cursor(rows[-1][1], rows[-1][0]) if has_more else None,
+            'has_more': has_more
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/monitoring/health-check', methods=['POST'])
+@app.route('/api/monitoring/latency')
 @require_auth
-def check_backend_health():
-    """Check health of a specific backend service"""
-    data = request.get_json()
-    service_url = data.get('url')
-    
-    if not service_url:
-        return jsonify({'error': 'URL is required'}), 400
+def get_latency():
+    """Latency percentiles and error rate over a window, answered from the rollups
     
+    Query parameters: since, until (default: the last hour), endpoint (exact
+    match) and resolution (minute, hour or day; picked from the window size
+    when omitted). Windows are widened to whole buckets of that resolution.
+    """
     try:
-        start_time = time.time()
-        response = requests.get(service_url, timeout=5)
-        response_time = int((time.time() - start_time) * 1000)
+        until = to_db_timestamp(request.args['until']) if request.args.get('until') else \
+            datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        since = to_db_timestamp(request.args['since']) if request.args.get('since') else \
+            (datetime.strptime(until, '%Y-%m-%d %H:%M:%S') - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+        window = datetime.strptime(until, '%Y-%m-%d %H:%M:%S') - datetime.strptime(since, '%Y-%m-%d %H:%M:%S')
+        if window.total_seconds() <= 0:
+            raise ValueError('since must be before until')
         
-        # Log health check to database
-        conn = sqlite3.connect('request_logs.db')
+        resolution = request.args.get('resolution')
+        if not resolution:
+            resolution = 'minute' if window <= timedelta(hours=6) else 'hour' if window <= timedelta(days=7) else 'day'
+        elif resolution not in ('minute', 'hour', 'day'):
+            raise ValueError('resolution must be minute, hour or day')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Align the start to the containing bucket
+    bucket_since = {'minute': since[:16] + ':00', 'hour': since[:13] + ':00:00', 'day': since[:10] + ' 00:00:00'}[resolution]
+    
+    try:
+        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO health_checks (service_url, status, response_time)
-            VALUES (?, ?, ?)
-        ''', (service_url, 'healthy' if response.ok else 'unhealthy', response_time))
-        conn.commit()
+        
+        clauses = ['resolution = ?', 'bucket_start >= ?', 'bucket_start < ?']
+        params = [resolution, bucket_since, until]
+        if request.args.get('endpoint'):
+            clauses.append('endpoint = ?')
+            params.append(request.args['endpoint'])
+        
+        cursor.execute(f'''
+            SELECT endpoint, SUM(request_count), SUM(error_count), SUM(total_response_time),
+                   MIN(min_response_time), MAX(max_response_time),
+                   {', '.join(f'SUM({column})' for column in HISTOGRAM_COLUMNS)}
+            FROM request_rollups
+            WHERE {' AND '.join(clauses)}
+            GROUP BY endpoint
+        ''', params)
+        rows = cursor.fetchall()
         conn.close()
         
+        overall = new_rollup()
+        endpoints = []
+        for row in rows:
+            rollup = list(row[1:])
+            merge_rollup(overall, rollup)
+            endpoints.append(dict(endpoint=row[0], **summarize_rollup(rollup)))
+        endpoints.sort(key=lambda e: e['count'], reverse=True)
+        
         return jsonify({
+            'since': bucket_since,
+            'until': until,
+            'resolution': resolution,
+            'overall': summarize_rollup(overall),
+            'endpoints': endpoints
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_health_filters(args):
+    """Translate health check query parameters into SQL clauses and parameters"""
+    clauses, params = [], []
+    for column in ('service_url', 'status'):
+        if args.get(column):
+            clauses.append(f'{column} = ?')
+            params.append(args[column])
+    if args.get('since'):
+        clauses.append('timestamp >= ?')
+        params.append(to_db_timestamp(args['since']))
+    if args.get('until'):
+        clauses.append('timestamp < ?')
+        params.append(to_db_timestamp(args['until']))
+    return clauses, params
+
+EXPORT_DATASETS = {
+    'request_logs': (('id', 'timestamp', 'method', 'endpoint', 'status_code', 'response_time', 'client_ip',
+                      'backend_url'), build_log_filters),
+    'health_checks': (('id', 'timestamp', 'service_url', 'status', 'response_time', 'error_message'),
+                      build_health_filters)
+}
+
+def export_rows(table, columns, clauses, params):
+    """Yield chunks of rows oldest first
+    
+    Each chunk is its own short keyset query on (timestamp, id), so a long
+    export neither holds memory nor pins one read snapshot (which would keep
+    the WAL from being checkpointed) for its whole duration. The filters
+    must leave the rows readable in index order (build_log_filters keeps
+    range filters off the leading index columns), or every chunk would sort
+    all remaining matches again.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        after = []
+        while True:
+            where = clauses + ['(timestamp, id) > (?, ?)'] if after else clauses
+            rows = conn.execute(f'''
+                SELECT {', '.join(columns)}
+                FROM {table}
+                {f"WHERE {' AND '.join(where)}" if where else ''}
+                ORDER BY timestamp, id
+                LIMIT ?
+            ''', params + after + [EXPORT_CHUNK_ROWS]).fetchall()
+            if not rows:
+                return
+            yield rows
+            after = [rows[-1][1], rows[-1][0]]
+    finally:
+        conn.close()
+
+def encode_export(chunks, columns, fmt):
+    """Render row chunks as NDJSON lines or CSV with a header row"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    else:
+        for rows in chunks:
+            yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows).encode('utf-8')
+
+def gzip_stream(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        data = compressor.compress(block)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@app.route('/api/monitoring/export/<dataset>')
+@require_auth
+def export_monitoring_data(dataset):
+    """Stream request_logs or health_checks as NDJSON or CSV, oldest first
+    
+    Takes the same filters as the log query (request_logs) or service_url,
+    status, since and until (health_checks). format is ndjson (default) or
+    csv; gzip=1 compresses the stream on the fly.
+    """
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'error': f"dataset must be one of {', '.join(EXPORT_DATASETS)}"}), 400
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    columns, build_filters = EXPORT_DATASETS[dataset]
+    try:
+        clauses, params = build_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    body = encode_export(export_rows(dataset, columns, clauses, params), columns, fmt)
+    filename = f'{dataset}.{fmt}'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if request.args.get('gzip') in ('1', 'true'):
+        body = gzip_stream(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
+
+def window_since(args):
+    """Start of the analytics window from ?seconds=, or None for the whole window"""
+    if not args.get('seconds'):
+        return None
+    seconds = float(args['seconds'])
+    if seconds <= 0:
+        raise ValueError('seconds must be positive')
+    return time.time() - seconds
+
+def window_scope():
+    """Bring the request window up to date and describe what it covers"""
+    request_window.refresh()
+    return {'scope': request_window.scope, 'worker_pid': os.getpid()}
+
+def ranked_groups(groups, span, sort, limit):
+    rows = []
+    for name, stats in groups.items():
+        rows.append({
+            'name': name,
+            'count': stats['count'],
+            'error_count': stats['errors'],
+            'error_rate': round(stats['errors'] / stats['count'] * 100, 2),
+            'avg': round(stats['total'] / stats['count'], 1),
+            'max': stats['max'],
+            'p95': round(stats['p95'], 1) if stats['p95'] is not None else None,
+            'rate_per_minute': round(stats['count'] / span * 60, 2) if span > 0 else None
+        })
+    rows.sort(key=lambda row: row[sort] or 0, reverse=True)
+    return rows[:limit]
+
+@app.route('/api/monitoring/analytics/summary')
+@require_auth
+def window_summary():
+    """Percentiles and status code histogram over the in-memory request window
+    
+    ?seconds= limits the window to the most recent seconds. In multi-worker
+    mode every worker fills its window from the shared request log, so the
+    answer covers the whole fleet (scope "fleet") whichever worker gives it.
+    """
+    try:
+        since = window_since(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    scope = window_scope()
+    return jsonify(dict(request_window.summary(since), capacity=request_window.capacity,
+                        vectorized=np is not None, **scope))
+
+@app.route('/api/monitoring/analytics/endpoints')
+@require_auth
+def window_endpoints():
+    """Top-N endpoints from the request window, slowest first by default
+    
+    Query parameters: seconds, limit (default 10), sort (p95, avg, max,
+    count or error_rate).
+    """
+    sort = request.args.get('sort', 'p95')
+    try:
+        since = window_since(request.args)
+        limit = min(max(int(request.args.get('limit', 10)), 1), 1000)
+        if sort not in ('p95', 'avg', 'max', 'count', 'error_rate'):
+            raise ValueError('sort must be p95, avg, max, count or error_rate')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    scope = window_scope()
+    groups, span = request_window.group_stats('endpoint', since, with_percentiles=True)
+    return jsonify(dict(endpoints=ranked_groups(groups, span, sort, limit), **scope))
+
+@app.route('/api/monitoring/analytics/clients')
+@require_auth
+def window_clients():
+    """Per-client request rates from the request window, busiest first
+    
+    Query parameters: seconds, limit (default 10), sort (count,
+    error_rate, avg or max).
+    """
+    sort = request.args.get('sort', 'count')
+    try:
+        since = window_since(request.args)
+        limit = min(max(int(request.args.get('limit', 10)), 1), 1000)
+        if sort not in ('count', 'error_rate', 'avg', 'max'):
+            raise ValueError('sort must be count, error_rate, avg or max')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    scope = window_scope()
+    groups, span = request_window.group_stats('client', since)
+    return jsonify(dict(clients=ranked_groups(groups, span, sort, limit), window_seconds=round(span, 1), **scope))
+
+# Shared keep-alive pool for health probes; urllib3 keeps one pool per host
+health_session = requests.Session()
+health_session_size = 0
+
+health_executor = None
+health_executor_pid = None
+health_executor_lock = threading.Lock()
+
+def size_health_session(concurrency):
+    """Grow the probe session's connection pools to serve this many probes at once"""
+    global health_session_size
+    with health_executor_lock:
+        if concurrency > health_session_size:
+            size = max(concurrency, HEALTH_SWEEP_WORKERS)
+            for prefix in ('http://', 'https://'):
+                health_session.mount(prefix, HTTPAdapter(pool_connections=max(size, 256), pool_maxsize=size))
+            health_session_size = size
+
+size_health_session(HEALTH_SWEEP_WORKERS)
+
+def get_health_executor():
+    """Thread pool for the scheduler's probes, recreated in a forked worker process"""
+    global health_executor, health_executor_pid
+    with health_executor_lock:
+        if health_executor_pid != os.getpid():
+            health_executor = ThreadPoolExecutor(max_workers=HEALTH_SWEEP_WORKERS, thread_name_prefix='health-probe')
+            health_executor_pid = os.getpid()
+        return health_executor
+
+def probe_backend(service_url, timeout=HEALTH_PROBE_TIMEOUT):
+    """Probe one backend URL and describe the outcome"""
+    start_time = time.time()
+    try:
+        response = health_session.get(service_url, timeout=timeout)
+        return {
             'url': service_url,
             'status': 'healthy' if response.ok else 'unhealthy',
             'status_code': response.status_code,
-            'response_time': response_time,
+            'response_time': int((time.time() - start_time) * 1000),
             'timestamp': datetime.now().isoformat()
-        })
-        
+        }
     except Exception as e:
-        # Log failed health check
-        conn = sqlite3.connect('request_logs.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO health_checks (service_url, status, response_time, error_message)
-            VALUES (?, ?, ?, ?)
-        ''', (service_url, 'error', 0, str(e)))
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
+        return {
             'url': service_url,
             'status': 'error',
             'error': str(e),
+            'response_time': 0,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+
+def record_health_checks(results):
+    """Store probe results in one transaction and push them to live dashboards"""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO health_checks (service_url, status, response_time, error_message)
+                VALUES (?, ?, ?, ?)
+            ''', [(r['url'], r['status'], r['response_time'], r.get('error')) for r in results])
+    finally:
+        conn.close()
+    for result in results:
+        event_broadcaster.publish('health', result)
+
+def configured_backend_hosts(config):
+    """Map each distinct backend host in the config to the endpoints routed to it"""
+    hosts = {}
+    for endpoint in config.get('endpoints', []):
+        label = f"{endpoint.get('method', 'GET')} {endpoint.get('endpoint')}"
+        for backend in endpoint.get('backend', []):
+            for host in backend.get('host', []):
+                hosts.setdefault(host.rstrip('/'), []).append(label)
+    return hosts
+
+class HealthScheduler:
+    """Probe each configured backend host on its own adaptive, jittered schedule
+    
+    The latest result per host is kept in memory, so status reads are a dict
+    lookup and never cause network I/O.
+    """
+
+    def __init__(self):
+        self.hosts = {}
+        self._heap = []
+        self._completed = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._hosts_loaded_at = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='health-scheduler', daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def snapshot(self, host=None):
+        now = time.monotonic()
+        with self._lock:
+            if host:
+                states = [self.hosts[host]] if host in self.hosts else []
+            else:
+                states = list(self.hosts.values())
+            return {
+                state['host']: {
+                    'status': state['status'],
+                    'last_result': state['last_result'],
+                    'last_change': state['last_change'],
+                    'consecutive_failures': state['consecutive_failures'],
+                    'consecutive_successes': state['consecutive_successes'],
+                    'interval': round(state['interval'], 1),
+                    'next_check_in': round(max(state['next_due'] - now, 0), 1),
+                    'endpoints': state['endpoints']
+                }
+                for state in states
+            }
+
+    def _schedule(self, state, interval):
+        state['interval'] = interval
+        jittered = interval * random.uniform(1 - HEALTH_JITTER, 1 + HEALTH_JITTER)
+        state['next_due'] = time.monotonic() + jittered
+        heapq.heappush(self._heap, (state['next_due'], state['host']))
+
+    def _refresh_hosts(self):
+        hosts = config_cache.derived('backend_hosts', configured_backend_hosts)
+        # Ejected hosts are gone from the config but must keep being probed to come back
+        ejected = host_pool_manager.ejected_hosts()
+        if ejected:
+            hosts = dict(hosts)
+            for host, endpoints in ejected.items():
+                hosts.setdefault(host, endpoints)
+        with self._lock:
+            for host, endpoints in hosts.items():
+                state = self.hosts.get(host)
+                if state is None:
+                    state = self.hosts[host] = {
+                        'host': host, 'status': 'unknown', 'last_result': None, 'last_change': None,
+                        'consecutive_failures': 0, 'consecutive_successes': 0,
+                        'interval': HEALTH_BASE_INTERVAL, 'next_due': 0, 'in_flight': False
+                    }
+                    # Spread first probes over one base interval instead of bursting
+                    state['next_due'] = time.monotonic() + random.uniform(0, HEALTH_BASE_INTERVAL)
+                    heapq.heappush(self._heap, (state['next_due'], host))
+                state['endpoints'] = endpoints
+            for host in [h for h in self.hosts if h not in hosts]:
+                # Stale heap entries for removed hosts are skipped when popped
+                del self.hosts[host]
+
+    def _probe(self, host):
+        result = probe_backend(host + HEALTH_PROBE_PATH)
+        result['host'] = host
+        with self._lock:
+            self._completed.append(result)
+            state = self.hosts.get(host)
+            if state is None:
+                return
+            state['in_flight'] = False
+            healthy = result['status'] == 'healthy'
+            # A flip between known states counts as flapping; the first result does not
+            changed = state['status'] not in ('unknown', result['status'])
+            if state['status'] != result['status']:
+                state['last_change'] = result['timestamp']
+            state['status'] = result['status']
+            state['last_result'] = result
+            if healthy:
+                state['consecutive_successes'] += 1
+                state['consecutive_failures'] = 0
+            else:
+                state['consecutive_failures'] += 1
+                state['consecutive_successes'] = 0
+            
+            if changed or not healthy:
+                interval = HEALTH_MIN_INTERVAL
+            else:
+                interval = min(state['interval'] * HEALTH_BACKOFF_FACTOR, HEALTH_MAX_INTERVAL)
+            self._schedule(state, interval)
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            if self._hosts_loaded_at is None or now - self._hosts_loaded_at >= HEALTH_CONFIG_REFRESH:
+                try:
+                    self._refresh_hosts()
+                except Exception as e:
+                    print(f"Health scheduler could not read config: {e}")
+                self._hosts_loaded_at = now
+            
+            due = []
+            with self._lock:
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, host = heapq.heappop(self._heap)
+                    state = self.hosts.get(host)
+                    if state is None or state['next_due'] != due_at or state['in_flight']:
+                        continue
+                    state['in_flight'] = True
+                    due.append(host)
+                completed, self._completed = self._completed, []
+                next_due = self._heap[0][0] if self._heap else now + 1
+            
+            for host in due:
+                get_health_executor().submit(self._probe, host)
+            
+            if completed:
+                try:
+                    record_health_checks(completed)
+                except sqlite3.Error as e:
+                    print(f"Error recording scheduled health checks: {e}")
+            
+            time.sleep(min(max(next_due - time.monotonic(), 0.05), 1.0))
+
+health_scheduler = HealthScheduler()
+
+@app.route('/api/monitoring/health-check', methods=['POST'])
+@require_auth
+def check_backend_health():
+    """Check health of a specific backend service"""
+    data = request.get_json()
+    service_url = data.get('url')
+    
+    if not service_url:
+        return jsonify({'error': 'URL is required'}), 400
+    
+    result = probe_backend(service_url)
+    try:
+        record_health_checks([result])
+    except sqlite3.Error as e:
+        print(f"Error recording health check: {e}")
+    return jsonify(result)
+
+@app.route('/api/monitoring/health-sweep', methods=['POST'])
+@require_auth
+def health_sweep():
+    """Probe every distinct backend host in the gateway config concurrently
+    
+    Optional JSON body: {"timeout": 5, "timeouts": {"<host>": 10}, "path": "/health"}.
+    The sweep takes about as long as the slowest probe, not the sum of them:
+    it gets its own pool with one thread per host (up to
+    HEALTH_SWEEP_MAX_WORKERS) rather than sharing the scheduler's one.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        default_timeout = float(data.get('timeout', HEALTH_PROBE_TIMEOUT))
+        timeouts = {host.rstrip('/'): float(t) for host, t in (data.get('timeouts') or {}).items()}
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'error': 'timeout values must be numbers'}), 400
+    path = data.get('path', '')
+    if not isinstance(path, str):
+        return jsonify({'error': 'path must be a string'}), 400
+    
+    try:
+        hosts = config_cache.derived('backend_hosts', configured_backend_hosts)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    start_time = time.time()
+    
+    workers = min(max(len(hosts), 1), HEALTH_SWEEP_MAX_WORKERS)
+    size_health_session(workers)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='health-sweep') as executor:
+        futures = {
+            host: executor.submit(probe_backend, host + path, timeouts.get(host, default_timeout))
+            for host in hosts
+        }
+        for host, future in futures.items():
+            result = future.result()
+            result['host'] = host
+            result['endpoints'] = hosts[host]
+            results.append(result)
+    
+    try:
+        if results:
+            record_health_checks(results)
+    except sqlite3.Error as e:
+        print(f"Error recording health sweep: {e}")
+    
+    summary = {'total': len(results), 'healthy': 0, 'unhealthy': 0, 'error': 0}
+    for result in results:
+        summary[result['status']] += 1
+    
+    return jsonify({
+        'results': results,
+        'summary': summary,
+        'duration_ms': int((time.time() - start_time) * 1000),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/monitoring/health-status')
+@require_auth
+def health_status():
+    """Latest scheduled probe result per backend host, served from memory
+    
+    Workers that don't run the scheduler (see start_background_services_as_leader)
+    answer from the newest stored probe per host instead.
+    """
+    host = request.args.get('host')
+    host = host.rstrip('/') if host else None
+    try:
+        hosts = health_scheduler.snapshot(host) if health_scheduler.running else stored_health_status(host)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'hosts': hosts,
+        'scheduler_running': health_scheduler.running,
+        'timestamp': datetime.now().isoformat()
+    })
+
+def stored_health_status(host=None):
+    hosts = configured_backend_hosts(config_cache.get()['config'])
+    if host:
+        hosts = {host: hosts[host]} if host in hosts else {}
+    if not hosts:
+        return {}
+    
+    urls = {h + HEALTH_PROBE_PATH: h for h in hosts}
+    since = (datetime.utcnow() - timedelta(seconds=HEALTH_MAX_INTERVAL * 2)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        # SQLite fills the bare columns from the row holding MAX(timestamp)
+        rows = conn.execute(f'''
+            SELECT service_url, status, response_time, error_message, MAX(timestamp)
+            FROM health_checks
+            WHERE service_url IN ({','.join('?' * len(urls))}) AND timestamp >= ?
+            GROUP BY service_url
+        ''', list(urls) + [since]).fetchall()
+    finally:
+        conn.close()
+    
+    snapshot = {h: {'status': 'unknown', 'last_result': None, 'endpoints': endpoints} for h, endpoints in hosts.items()}
+    for url, status, response_time, error, timestamp in rows:
+        result = {'url': url, 'host': urls[url], 'status': status, 'response_time': response_time,
+                  'timestamp': timestamp}
+        if error:
+            result['error'] = error
+        snapshot[urls[url]].update(status=status, last_result=result)
+    return snapshot
+
+DURATION_PATTERN = re.compile(r'^(\d+)([smhd])$')
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+HISTORY_BUCKET_STEPS = (60, 300, 900, 3600, 6 * 3600, 86400)
+
+def parse_duration(value):
+    """Parse durations such as '90s', '5m', '24h' or '30d' into seconds"""
+    match = DURATION_PATTERN.match(value.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f'invalid duration: {value}')
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+def health_history_window(args):
+    """Resolve since/until/range and bucket query parameters into an aligned window"""
+    until = to_db_timestamp(args['until']) if args.get('until') else \
+        datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    until_epoch = int(datetime.strptime(until, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp())
+    if args.get('since'):
+        since_epoch = int(datetime.strptime(to_db_timestamp(args['since']), '%Y-%m-%d %H:%M:%S')
+                          .replace(tzinfo=timezone.utc).timestamp())
+    else:
+        since_epoch = until_epoch - parse_duration(args.get('range', '24h'))
+    if since_epoch >= until_epoch:
+        raise ValueError('since must be before until')
+    
+    if args.get('bucket'):
+        bucket = parse_duration(args['bucket'])
+    else:
+        bucket = next((step for step in HISTORY_BUCKET_STEPS
+                       if (until_epoch - since_epoch) / step <= HEALTH_HISTORY_DEFAULT_BUCKETS), HISTORY_BUCKET_STEPS[-1])
+    # Align to whole buckets so repeated chart refreshes hit the same boundaries
+    since_epoch -= since_epoch % bucket
+    if (until_epoch - since_epoch) / bucket > HEALTH_HISTORY_MAX_BUCKETS:
+        raise ValueError(f'too many buckets; use a bucket of at least {(until_epoch - since_epoch) // HEALTH_HISTORY_MAX_BUCKETS}s')
+    return since_epoch, until_epoch, bucket
+
+def epoch_to_db(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def query_health_history(service_urls, since_epoch, until_epoch, bucket):
+    """Per-bucket health summaries for the given services (all services when empty)
+    
+    Hours that maintenance already downsampled come from health_rollups, the
+    rest from raw health_checks grouped in SQL on (service_url, timestamp).
+    Rollups are hourly, so downsampled hours land whole in the containing bucket.
+    """
+    since, until = epoch_to_db(since_epoch), epoch_to_db(until_epoch)
+    url_clause = f" AND service_url IN ({','.join('?' * len(service_urls))})" if service_urls else ''
+    
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute("SELECT value FROM maintenance_state WHERE name = 'health_downsampled_through'").fetchone()
+        raw_since = max(since, row[0]) if row else since
+        
+        buckets = {}
+        rows = conn.execute(f'''
+            SELECT service_url, CAST((strftime('%s', timestamp) - ?) / ? AS INTEGER), status, error_message,
+                   {latency_bucket_sql('response_time')}, COUNT(*),
+                   SUM(response_time), MIN(response_time), MAX(response_time)
+            FROM health_checks
+            WHERE timestamp >= ? AND timestamp < ?{url_clause}
+            GROUP BY 1, 2, 3, 4, 5
+        ''', [since_epoch, bucket, raw_since, until] + list(service_urls))
+        fold_health_rows(buckets, rows)
+        
+        if raw_since > since:
+            rows = conn.execute(f'''
+                SELECT service_url, CAST((strftime('%s', bucket_start) - ?) / ? AS INTEGER), check_count,
+                       healthy_count, responded_count, total_response_time, min_response_time,
+                       max_response_time, {', '.join(HISTOGRAM_COLUMNS)}, errors
+                FROM health_rollups
+                WHERE bucket_start >= ? AND bucket_start < ?{url_clause}
+            ''', [since_epoch, bucket, since, raw_since] + list(service_urls))
+            for url, key, checks, healthy, responded, total, lowest, highest, *rest in rows:
+                target = buckets.get((url, key))
+                if target is None:
+                    target = buckets[(url, key)] = new_health_bucket()
+                target['checks'] += checks
+                target['healthy'] += healthy
+                if responded:
+                    merge_rollup(target['latency'], [responded, 0, total, lowest, highest] + rest[:-1])
+                for error, count in json.loads(rest[-1] or '{}').items():
+                    target['errors'][error] = target['errors'].get(error, 0) + count
+    finally:
+        conn.close()
+    
+    history = {}
+    for (url, key), target in sorted(buckets.items()):
+        history.setdefault(url, []).append(
+            dict(start=epoch_to_db(since_epoch + key * bucket), **summarize_health_bucket(target)))
+    return history
+
+@app.route('/api/monitoring/health-history')
+@app.route('/api/monitoring/health-history/<path:service_url>')
+@require_auth
+def get_health_history(service_url=None):
+    """Downsampled health history for one service, or several in one response
+    
+    Query parameters: range (e.g. 24h, 30d; default 24h) or since/until,
+    bucket (e.g. 5m, 1h; picked from the range when omitted) and, without a
+    service in the path, repeated service_url filters (default: all services).
+    Empty buckets are omitted.
+    """
+    try:
+        since_epoch, until_epoch, bucket = health_history_window(request.args)
+    except (ValueError, OverflowError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        service_urls = [service_url] if service_url else request.args.getlist('service_url')
+        history = query_health_history(service_urls, since_epoch, until_epoch, bucket)
+        window = {'since': epoch_to_db(since_epoch), 'until': epoch_to_db(until_epoch), 'bucket_seconds': bucket}
+        if service_url:
+            return jsonify(dict(service_url=service_url, history=history.get(service_url, []), **window))
+        return jsonify(dict(services=history, **window))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ================================================================================
+# DATA RETENTION
+# ================================================================================
+
+def latency_bucket_sql(column):
+    """SQL CASE expression giving the LATENCY_BUCKETS_MS histogram index of a column"""
+    cases = ' '.join(f'WHEN {column} <= {bound} THEN {i}' for i, bound in enumerate(LATENCY_BUCKETS_MS))
+    return f'CASE {cases} ELSE {len(LATENCY_BUCKETS_MS)} END'
+
+def new_health_bucket():
+    return {'checks': 0, 'healthy': 0, 'latency': new_rollup(), 'errors': {}}
+
+def fold_health_rows(buckets, rows):
+    """Fold grouped health check rows into buckets keyed by (service_url, bucket)
+    
+    Rows are (service_url, bucket, status, error_message, latency bucket index,
+    count, total, min and max response time). Failed probes count against
+    uptime and the error tally but not latency, since they never got a response.
+    """
+    for url, key, status, error, bucket, count, total, lowest, highest in rows:
+        target = buckets.get((url, key))
+        if target is None:
+            target = buckets[(url, key)] = new_health_bucket()
+        target['checks'] += count
+        if status == 'healthy':
+            target['healthy'] += count
+        if status == 'error':
+            error = error or 'unknown error'
+            target['errors'][error] = target['errors'].get(error, 0) + count
+            continue
+        if status != 'healthy':
+            target['errors'][status] = target['errors'].get(status, 0) + count
+        latency = [count, 0, total or 0, lowest, highest] + [0] * len(HISTOGRAM_COLUMNS)
+        latency[5 + bucket] = count
+        merge_rollup(target['latency'], latency)
+
+def summarize_health_bucket(bucket):
+    latency = summarize_rollup(bucket['latency'])
+    errors = bucket['errors']
+    return {
+        'checks': bucket['checks'],
+        'uptime': round(bucket['healthy'] / bucket['checks'] * 100, 2) if bucket['checks'] else None,
+        'min_response_time': latency['min'],
+        'avg_response_time': latency['avg'],
+        'p95_response_time': latency['p95'],
+        'dominant_error': max(errors, key=errors.get) if errors else None
+    }
+
+class RetentionManager:
+    """Background maintenance: downsample, expire and incrementally vacuum monitoring data"""
+
+    def __init__(self):
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='retention-manager', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Maintenance run failed: {e}")
+            time.sleep(MAINTENANCE_INTERVAL)
+
+    def run_once(self):
+        with self._lock:
+            started = time.monotonic()
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                budget = [MAINTENANCE_MAX_ROWS_PER_RUN]
+                report = {'downsampled_health_days': self._downsample_health(conn)}
+                
+                raw_cutoff = self._cutoff(RETENTION_RAW_DAYS)
+                report['request_logs_deleted'] = self._delete_batched(conn, '''
+                    SELECT id FROM request_logs WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+                ''', 'DELETE FROM request_logs WHERE id IN ({})', [raw_cutoff], budget)
+                
+                # Health rows are only removed once their day has been downsampled
+                downsampled_through = self._state(conn, 'health_downsampled_through')
+                report['health_checks_deleted'] = 0
+                if downsampled_through:
+                    report['health_checks_deleted'] = self._delete_batched(conn, '''
+                        SELECT id FROM health_checks WHERE timestamp < ? ORDER BY timestamp LIMIT ?
+                    ''', 'DELETE FROM health_checks WHERE id IN ({})', [min(raw_cutoff, downsampled_through)], budget)
+                
+                report['rollups_deleted'] = 0
+                for resolution, days in RETENTION_ROLLUP_DAYS.items():
+                    report['rollups_deleted'] += self._delete_batched(conn, '''
+                        SELECT rowid FROM request_rollups WHERE resolution = ? AND bucket_start < ? LIMIT ?
+                    ''', 'DELETE FROM request_rollups WHERE rowid IN ({})', [resolution, self._cutoff(days)], budget)
+                report['health_rollups_deleted'] = self._delete_batched(conn, '''
+                    SELECT rowid FROM health_rollups WHERE bucket_start < ? LIMIT ?
+                ''', 'DELETE FROM health_rollups WHERE rowid IN ({})', [self._cutoff(RETENTION_HEALTH_ROLLUP_DAYS)], budget)
+                
+                freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                conn.execute(f'PRAGMA incremental_vacuum({MAINTENANCE_VACUUM_PAGES})').fetchall()
+                report['pages_vacuumed'] = freelist - conn.execute('PRAGMA freelist_count').fetchone()[0]
+                report['incremental_vacuum'] = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+            finally:
+                conn.close()
+            
+            report['budget_exhausted'] = budget[0] <= 0
+            report['duration_ms'] = int((time.monotonic() - started) * 1000)
+            report['finished_at'] = datetime.now().isoformat()
+            self.last_run = report
+            return report
+
+    def convert_to_incremental(self):
+        """One full VACUUM that switches an existing database to incremental auto-vacuum
+        
+        It rewrites the whole file and blocks writers meanwhile, so it only
+        runs when an operator asks for it.
+        """
+        with self._lock:
+            started = time.monotonic()
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                    return {'converted': False, 'incremental_vacuum': True, 'duration_ms': 0}
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+                return {'converted': True,
+                        'incremental_vacuum': conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2,
+                        'duration_ms': int((time.monotonic() - started) * 1000)}
+            finally:
+                conn.close()
+
+    def _cutoff(self, days):
+        return (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _state(self, conn, name):
+        row = conn.execute('SELECT value FROM maintenance_state WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _delete_batched(self, conn, select_sql, delete_sql, params, budget):
+        """Delete matching rows a batch per transaction, pausing between batches"""
+        deleted = 0
+        while budget[0] > 0:
+            ids = [row[0] for row in conn.execute(select_sql, params + [min(MAINTENANCE_BATCH_ROWS, budget[0])])]
+            if not ids:
+                break
+            with conn:
+                conn.execute(delete_sql.format(','.join('?' * len(ids))), ids)
+            deleted += len(ids)
+            budget[0] -= len(ids)
+            time.sleep(MAINTENANCE_BATCH_PAUSE)
+        return deleted
+
+    def _downsample_health(self, conn):
+        """Fold whole days of raw health checks older than the raw window into hourly rollups"""
+        done = 0
+        limit_day = self._cutoff(RETENTION_RAW_DAYS)[:10]
+        while True:
+            through = self._state(conn, 'health_downsampled_through')
+            row = conn.execute(
+                'SELECT MIN(timestamp) FROM health_checks WHERE timestamp >= ?', (through or '',)
+            ).fetchone()
+            if row[0] is None or row[0][:10] >= limit_day:
+                return done
+            
+            day = row[0][:10]
+            next_day = (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            self.downsample_health_range(conn, f'{day} 00:00:00', f'{next_day} 00:00:00')
+            with conn:
+                conn.execute('''
+                    INSERT INTO maintenance_state (name, value) VALUES ('health_downsampled_through', ?)
+                    ON CONFLICT (name) DO UPDATE SET value = excluded.value
+                ''', (f'{next_day} 00:00:00',))
+            done += 1
+
+    @staticmethod
+    def downsample_health_range(conn, since, until):
+        """Write hourly health_rollups for raw health checks in [since, until)"""
+        buckets = {}
+        rows = conn.execute(f'''
+            SELECT service_url, substr(timestamp, 1, 13) || ':00:00', status, error_message,
+                   {latency_bucket_sql('response_time')}, COUNT(*),
+                   SUM(response_time), MIN(response_time), MAX(response_time)
+            FROM health_checks
+            WHERE timestamp >= ? AND timestamp < ?
+            GROUP BY 1, 2, 3, 4, 5
+        ''', (since, until))
+        fold_health_rows(buckets, rows)
+        
+        with conn:
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO health_rollups (
+                    service_url, bucket_start, check_count, healthy_count, responded_count,
+                    total_response_time, min_response_time, max_response_time, {', '.join(HISTOGRAM_COLUMNS)}, errors
+                )
+                VALUES ({', '.join('?' * (9 + len(HISTOGRAM_COLUMNS)))})
+            ''', [
+                (url, hour, r['checks'], r['healthy'], r['latency'][0], r['latency'][2], r['latency'][3],
+                 r['latency'][4], *r['latency'][5:], json.dumps(r['errors']) if r['errors'] else None)
+                for (url, hour), r in buckets.items()
+            ])
+        return len(buckets)
+
+retention_manager = RetentionManager()
+
+@app.route('/api/maintenance/status')
+@require_auth
+def maintenance_status():
+    return jsonify({'last_run': retention_manager.last_run, 'raw_retention_days': RETENTION_RAW_DAYS,
+                    'rollup_retention_days': RETENTION_ROLLUP_DAYS})
+
+@app.route('/api/maintenance/run', methods=['POST'])
+@require_auth
+def run_maintenance():
+    """Run one retention/vacuum pass now instead of waiting for the next interval"""
+    try:
+        return jsonify(retention_manager.run_once())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maintenance/vacuum', methods=['POST'])
+@require_auth
+def convert_vacuum_mode():
+    """Switch a database created before incremental vacuuming over with one full VACUUM"""
+    try:
+        return jsonify(retention_manager.convert_to_incremental())
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# ================================================================================
+# KRAKEND ACCESS LOG INGESTION
+# ================================================================================
+
+# [KRAKEND] [GIN] 2024/01/02 - 15:04:05 | 200 |  1.402ms |  172.17.0.1 | GET      "/api/team?x=1"
+# Latencies are Go durations, compound past a minute (1m2.5s); parse_go_duration converts them.
+ACCESS_LOG_PATTERN = re.compile(
+    r'(?:\[[^\]]*\]\s*)?\[GIN\]\s*(\d{4})/(\d{2})/(\d{2}) - (\d{2}:\d{2}:\d{2})\s*\|\s*(\d{3})\s*\|'
+    r'\s*((?:\d+(?:\.\d+)?(?:ns|µs|us|ms|s|m|h))+)\s*\|\s*(\S*)\s*\|\s*([A-Z]+)\s+"([^"?]*)'
+)
+
+def resolve_backend_url(method, path):
+    """Backend host + url_pattern of the configured endpoint a gateway request matched"""
+    tries = config_cache.derived('route_tries', build_route_tries)
+    root = tries.get(method)
+    index = match_route(root, [segment for segment in path.split('/') if segment]) if root else None
+    if index is None:
+        return None
+    backends = config_cache.get()['config']['endpoints'][index].get('backend') or [{}]
+    hosts = backends[0].get('host') or ['']
+    return hosts[0].rstrip('/') + backends[0].get('url_pattern', '')
+
+class KrakendLogIngester:
+    """Follow the gateway access log and bulk-load it into request_logs
+    
+    The byte offset and inode are committed in the same transaction as the
+    rows they produced, so restarts neither skip nor duplicate lines. A
+    rename rotation is handled by draining the old file before switching,
+    and truncation (copytruncate) by starting over at offset 0.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.counters = {'lines': 0, 'ingested': 0, 'skipped': 0, 'rotations': 0, 'errors': 0}
+        self.offset = 0
+        self.inode = None
+        self._file = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='krakend-log-ingester', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        try:
+            size = os.stat(self.path).st_size
+        except OSError:
+            size = None
+        return dict(self.counters, path=self.path, inode=self.inode, offset=self.offset,
+                    running=self._thread is not None and self._thread.is_alive(),
+                    lag_bytes=size - self.offset if size is not None and self._file is not None else None)
+
+    def _open(self, path, offset):
+        self._file = open(path, 'rb')
+        self.inode = os.fstat(self._file.fileno()).st_ino
+        self.offset = offset if os.fstat(self._file.fileno()).st_size >= offset else 0
+
+    def _restore(self, conn):
+        row = conn.execute('SELECT inode, offset FROM log_ingest_state WHERE path = ?', (self.path,)).fetchone()
+        if row is None:
+            return
+        inode, offset = row
+        for candidate in (self.path, self.path + '.1'):
+            try:
+                if os.stat(candidate).st_ino == inode:
+                    # Resume where we stopped, even if that file has since been rotated
+                    self._open(candidate, offset)
+                    return
+            except OSError:
+                continue
 
-@app.route('/api/monitoring/health-history/<path:service_url>')
-@require_auth
-def get_health_history(service_url):
-    """Get health check history for a service"""
-    try:
-        conn = sqlite3.connect('request_logs.db')
-        cursor = conn.cursor()
+    def _run(self):
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            self._restore(conn)
+        except Exception as e:
+            print(f"Log ingester could not restore its position: {e}")
+        while True:
+            try:
+                progressed = self._poll(conn)
+            except Exception as e:
+                self.counters['errors'] += 1
+                print(f"Log ingestion error: {e}")
+                progressed = False
+            if not progressed:
+                time.sleep(KRAKEND_LOG_POLL)
+
+    def _poll(self, conn):
+        if self._file is None:
+            if not os.path.exists(self.path):
+                return False
+            self._open(self.path, 0)
         
-        # Get last 24 hours of health checks
-        yesterday = datetime.now() - timedelta(days=1)
-        cursor.execute('''
-            SELECT timestamp, status, response_time, error_message
-            FROM health_checks 
-            WHERE service_url = ? AND timestamp > ?
-            ORDER BY timestamp DESC
-        ''', (service_url, yesterday.isoformat()))
-        
-        history = []
-        for row in cursor.fetchall():
-            history.append({
-                'timestamp': row[0],
-                'status': row[1],
-                'response_time': row[2],
-                'error_message': row[3]
-            })
+        self._file.seek(self.offset)
+        chunk = self._file.read(KRAKEND_LOG_CHUNK)
+        if chunk:
+            end = chunk.rfind(b'\n')
+            if end < 0:
+                if len(chunk) < KRAKEND_LOG_CHUNK:
+                    return False  # an unfinished line; wait for the rest
+                end = len(chunk) - 1  # a single oversized line; skip it
+            self._ingest(conn, chunk[:end + 1], self.offset + end + 1)
+            return True
         
-        conn.close()
-        return jsonify({'service_url': service_url, 'history': history})
+        # At EOF: check whether the file was rotated or truncated under us
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        if st.st_ino != self.inode:
+            self._file.close()
+            self._open(self.path, 0)
+            self.counters['rotations'] += 1
+            return True
+        if st.st_size < self.offset:
+            self.offset = 0
+            self.counters['rotations'] += 1
+            return True
+        return False
+
+    def _ingest(self, conn, data, new_offset):
+        rows = []
+        resolved = {}
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        for line in lines:
+            match = ACCESS_LOG_PATTERN.search(line)
+            if match is None:
+                continue
+            year, month, day, clock, status, duration, client_ip, method, path = match.groups()
+            key = (method, path)
+            if key not in resolved:
+                resolved[key] = resolve_backend_url(method, path)
+            rows.append((f'{year}-{month}-{day} {clock}', method, path, int(status),
+                         int(parse_go_duration(duration) * 1000), client_ip or None, resolved[key]))
         
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        with conn:
+            if rows:
+                conn.executemany(RequestLogWriter.INSERT_SQL, rows)
+                fold_into_rollups(conn, rows)
+            conn.execute('''
+                INSERT INTO log_ingest_state (path, inode, offset, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (path) DO UPDATE SET inode = excluded.inode, offset = excluded.offset,
+                    updated_at = excluded.updated_at
+            ''', (self.path, self.inode, new_offset))
+        
+        for row in rows:
+            timestamp = datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+            request_window.append(timestamp, row[1], row[2], row[3], row[4], row[5])
+        
+        self.offset = new_offset
+        self.counters['lines'] += len(lines)
+        self.counters['ingested'] += len(rows)
+        self.counters['skipped'] += len(lines) - len(rows)
+        
+        # Show gateway traffic on live dashboards, capped so a backlog can't flood them
+        for row in rows[-200:]:
+            event_broadcaster.publish('requests', {
+                'timestamp': row[0], 'method': row[1], 'endpoint': row[2], 'status_code': row[3],
+                'response_time': row[4], 'client_ip': row[5], 'backend_url': row[6], 'source': 'gateway'
+            })
+
+krakend_log_ingester = KrakendLogIngester(KRAKEND_LOG_PATH)
+
+@app.route('/api/monitoring/ingest-status')
+@require_auth
+def ingest_status():
+    """Progress of the KrakenD access log ingester"""
+    return jsonify(krakend_log_ingester.stats())
 
 # ================================================================================
 # EXISTING CONFIGURATION ENDPOINTS (Enhanced)
 # ================================================================================
 
+class ConfigCache:
+    """Parsed krakend.json, re-read only when the file's mtime, size or inode changes
+    
+    A changed stat with identical content (a touch, a no-op save) keeps the
+    existing parse and everything derived from it. Treat the returned config
+    as read-only; use load_mutable() for a private copy to edit.
+    """
+
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        st = os.stat(CONFIG_PATH)
+        stat_key = (CONFIG_PATH, st.st_mtime_ns, st.st_size, st.st_ino)
+        entry = self._entry
+        if entry is not None and entry['stat_key'] == stat_key:
+            return entry
+        
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry['stat_key'] == stat_key:
+                return entry
+            
+            with open(CONFIG_PATH, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            
+            if entry is not None and entry['digest'] == digest and entry['stat_key'][0] == CONFIG_PATH:
+                config, derived = entry['config'], entry['derived']
+            else:
+                config, derived = json.loads(raw), {}
+            
+            self._entry = entry = {
+                'stat_key': stat_key,
+                'raw': raw,
+                'digest': digest,
+                'config': config,
+                # Content-derived values (validation, host maps) keyed by name
+                'derived': derived,
+                # Stat changes alter last_modified in the metadata, so they change the ETag too
+                'etag': f'"{digest[:32]}-{st.st_mtime_ns:x}"',
+                'metadata': {
+                    'total_endpoints': len(config.get('endpoints', [])),
+                    'port': config.get('port', 8684),
+                    'cors_enabled': 'security/cors' in config.get('extra_config', {}),
+                    'last_modified': datetime.fromtimestamp(st.st_mtime).isoformat(),
+                    'file_size': st.st_size,
+                    'version': config.get('version', 'unknown')
+                },
+                'body': None
+            }
+            return entry
+
+    def derived(self, name, compute):
+        """Value computed from the current config, reused until the content changes"""
+        entry = self.get()
+        derived = entry['derived']
+        if name not in derived:
+            derived[name] = compute(entry['config'])
+        return derived[name]
+
+    def load_mutable(self):
+        return json.loads(self.get()['raw'])
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+config_cache = ConfigCache()
+
+def client_has_etag(etag):
+    return request.if_none_match.contains(etag.strip('"'))
+
+def not_modified(etag):
+    return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
 @app.route('/config')
 @require_auth
 def get_config():
-    """Get current KrakenD configuration with enhanced metadata"""
-    try:
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-        
-        # Enhanced metadata
-        metadata = {
-            'total_endpoints': len(config.get('endpoints', [])),
-            'port': config.get('port', 8684),
-            'cors_enabled': 'security/cors' in config.get('extra_config', {}),
-            'last_modified': datetime.fromtimestamp(os.path.getmtime(CONFIG_PATH)).isoformat(),
-            'file_size': os.path.getsize(CONFIG_PATH),
-            'version': config.get('version', 'unknown')
-        }
+    """Get current KrakenD configuration with enhanced metadata
+    
+    Served with a strong ETag; If-None-Match gets a 304 while the file is unchanged.
+    """
+    try:
+        entry = config_cache.get()
+        if client_has_etag(entry['etag']):
+            return not_modified(entry['etag'])
         
-        return jsonify({
-            'config': config,
-            'metadata': metadata
-        })
+        if entry['body'] is None:
+            entry['body'] = app.json.dumps({
+                'config': entry['config'],
+                'metadata': entry['metadata']
+            })
+        
+        return Response(entry['body'], mimetype='application/json',
+                        headers={'ETag': entry['etag'], 'Cache-Control': 'no-cache'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Serializes read-modify-write cycles on krakend.json, across workers in multi-worker mode
+config_write_lock = FileLock(SHARED_STATE_PATH + '.config.lock' if SHARED_STATE_PATH else None)
+
+def save_config(config):
+    """Atomically replace krakend.json: write a temp file, fsync it, then rename over the original"""
+    directory = os.path.dirname(os.path.abspath(CONFIG_PATH))
+    fd, temp_path = tempfile.mkstemp(prefix='.krakend-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(CONFIG_PATH):
+            os.chmod(temp_path, os.stat(CONFIG_PATH).st_mode & 0o777)
+        os.replace(temp_path, CONFIG_PATH)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    config_cache.invalidate()
+    
+    if RESTART_ON_CONFIG_CHANGE:
+        restart_queue.submit('config change')
+
+# Performance settings accepted by the endpoint API. Durations are KrakenD
+# (Go) duration strings; bounds are (min, max) in seconds or plain units.
+GO_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ns|us|µs|ms|s|m|h)')
+GO_DURATION_SECONDS = {'ns': 1e-9, 'us': 1e-6, 'µs': 1e-6, 'ms': 1e-3, 's': 1, 'm': 60, 'h': 3600}
+ENDPOINT_TIMEOUT_BOUNDS = (0.001, 600)
+ENDPOINT_CACHE_TTL_BOUNDS = (0, 30 * 86400)
+CONCURRENT_CALLS_BOUNDS = (1, 10)
+RATE_LIMIT_FIELDS = {'max_rate': (0.001, 1000000), 'capacity': (1, 1000000)}
+RATE_LIMIT_EVERY_BOUNDS = (0.001, 3600)
+CIRCUIT_BREAKER_FIELDS = {'interval': (1, 86400), 'timeout': (1, 86400), 'max_errors': (1, 100000)}
+
+HTTP_CACHE_NAMESPACE = 'qos/http-cache'
+RATE_LIMIT_NAMESPACE = 'qos/ratelimit/proxy'
+CIRCUIT_BREAKER_NAMESPACE = 'qos/circuit-breaker'
+
+def parse_go_duration(value):
+    """Seconds in a Go duration string such as '1500ms' or '1m30s'"""
+    if not isinstance(value, str) or not value:
+        raise ValueError(f'invalid duration: {value!r}')
+    parts = GO_DURATION_PATTERN.findall(value)
+    if ''.join(number + unit for number, unit in parts) != value:
+        raise ValueError(f'invalid duration: {value!r}')
+    return sum(float(number) * GO_DURATION_SECONDS[unit] for number, unit in parts)
+
+def as_duration(value, unit):
+    """Accept a Go duration string, or a bare number in the given unit"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f'{value}{unit}'
+    if isinstance(value, float):
+        # Fixed-point of the shortest repr: no exponent, no lost digits
+        return f"{Decimal(repr(value)):f}{unit}"
+    return value
+
+def format_bound(value):
+    return str(int(value)) if float(value).is_integer() else f'{value:g}'
+
+def bounded_number_error(name, value, bounds, integer=False):
+    kinds = (int,) if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, kinds):
+        return f"{name} must be {'an integer' if integer else 'a number'}"
+    if not bounds[0] <= value <= bounds[1]:
+        return f'{name} must be between {format_bound(bounds[0])} and {format_bound(bounds[1])}'
+    return None
+
+def bounded_duration_error(name, value, bounds):
+    try:
+        seconds = parse_go_duration(value)
+    except ValueError:
+        return f"{name} must be a duration like '500ms', '2s' or '1m'"
+    if not bounds[0] <= seconds <= bounds[1]:
+        return f'{name} must be between {format_bound(bounds[0])}s and {format_bound(bounds[1])}s'
+    return None
+
+def endpoint_setting_errors(endpoint):
+    """Bounds-check the performance settings of one endpoint definition"""
+    errors = []
+    if 'timeout' in endpoint:
+        errors.append(bounded_duration_error('timeout', endpoint['timeout'], ENDPOINT_TIMEOUT_BOUNDS))
+    if 'cache_ttl' in endpoint:
+        errors.append(bounded_duration_error('cache_ttl', endpoint['cache_ttl'], ENDPOINT_CACHE_TTL_BOUNDS))
+    if 'concurrent_calls' in endpoint:
+        errors.append(bounded_number_error('concurrent_calls', endpoint['concurrent_calls'],
+                                           CONCURRENT_CALLS_BOUNDS, integer=True))
+    
+    for b, backend in enumerate(endpoint.get('backend') or []):
+        extra = backend.get('extra_config') or {}
+        if HTTP_CACHE_NAMESPACE in extra:
+            cache = extra[HTTP_CACHE_NAMESPACE]
+            if not isinstance(cache, dict) or not isinstance(cache.get('shared', False), bool):
+                errors.append(f"backend {b} {HTTP_CACHE_NAMESPACE} must be an object with an optional boolean 'shared'")
+        if RATE_LIMIT_NAMESPACE in extra:
+            limit = extra[RATE_LIMIT_NAMESPACE]
+            if not isinstance(limit, dict) or 'max_rate' not in limit:
+                errors.append(f'backend {b} {RATE_LIMIT_NAMESPACE} requires max_rate')
+            else:
+                for field, bounds in RATE_LIMIT_FIELDS.items():
+                    if field in limit:
+                        errors.append(bounded_number_error(f'backend {b} rate limit {field}', limit[field], bounds,
+                                                           integer=field == 'capacity'))
+                if 'every' in limit:
+                    errors.append(bounded_duration_error(f'backend {b} rate limit every', limit['every'],
+                                                         RATE_LIMIT_EVERY_BOUNDS))
+        if CIRCUIT_BREAKER_NAMESPACE in extra:
+            breaker = extra[CIRCUIT_BREAKER_NAMESPACE]
+            if not isinstance(breaker, dict) or any(field not in breaker for field in CIRCUIT_BREAKER_FIELDS):
+                errors.append(f"backend {b} {CIRCUIT_BREAKER_NAMESPACE} requires {', '.join(CIRCUIT_BREAKER_FIELDS)}")
+            else:
+                for field, bounds in CIRCUIT_BREAKER_FIELDS.items():
+                    errors.append(bounded_number_error(f'backend {b} circuit breaker {field}', breaker[field], bounds,
+                                                       integer=True))
+    return [error for error in errors if error]
+
+def set_extra_config(target, namespace, value):
+    """Set or, for None/False, remove one extra_config namespace"""
+    if value is None or value is False:
+        extra = target.get('extra_config')
+        if extra:
+            extra.pop(namespace, None)
+            if not extra:
+                del target['extra_config']
+    else:
+        target.setdefault('extra_config', {})[namespace] = value
+
+def apply_performance_settings(endpoint, data):
+    """Copy the performance fields of an add/update request onto an endpoint
+    
+    timeout and cache_ttl take Go durations (bare numbers mean ms and s),
+    concurrent_calls an integer; http_cache (true or {"shared": ...}),
+    rate_limit ({"max_rate", "capacity", "every"}) and circuit_breaker
+    ({"interval", "timeout", "max_errors", ...}) become extra_config on every
+    backend. null removes a setting.
+    """
+    for field, unit in (('timeout', 'ms'), ('cache_ttl', 's'), ('concurrent_calls', None)):
+        if field not in data:
+            continue
+        if data[field] is None:
+            endpoint.pop(field, None)
+        else:
+            endpoint[field] = as_duration(data[field], unit) if unit else data[field]
+    
+    blocks = {}
+    if 'http_cache' in data:
+        cache = data['http_cache']
+        blocks[HTTP_CACHE_NAMESPACE] = {} if cache is True else cache
+    if 'rate_limit' in data:
+        limit = data['rate_limit']
+        if isinstance(limit, dict) and 'every' in limit:
+            limit = dict(limit, every=as_duration(limit['every'], 's'))
+        blocks[RATE_LIMIT_NAMESPACE] = limit
+    if 'circuit_breaker' in data:
+        blocks[CIRCUIT_BREAKER_NAMESPACE] = data['circuit_breaker']
+    for backend in endpoint.get('backend') or []:
+        for namespace, value in blocks.items():
+            set_extra_config(backend, namespace, value)
+    
+    errors = endpoint_setting_errors(endpoint)
+    if errors:
+        raise ValueError('; '.join(errors))
+
+def backend_hosts(data):
+    """Host pool of an add/update request: backend_hosts (list) or backend_host"""
+    hosts = data['backend_hosts'] if 'backend_hosts' in data else [data.get('backend_host')]
+    if not isinstance(hosts, list) or not hosts or not all(isinstance(h, str) and h for h in hosts):
+        raise ValueError('backend_hosts must be a non-empty list of host URLs')
+    if len(set(h.rstrip('/') for h in hosts)) != len(hosts):
+        raise ValueError('backend_hosts contains duplicates')
+    return hosts
+
+def build_endpoint(data):
+    """Build a new endpoint definition from an add request"""
+    missing = [field for field in ('endpoint', 'method') if not data.get(field)]
+    if not data.get('backend_host') and not data.get('backend_hosts'):
+        missing.append('backend_host')
+    if missing:
+        raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+    for field in ('endpoint', 'method', 'backend_path'):
+        if field in data and not isinstance(data[field], str):
+            raise ValueError(f"'{field}' must be a string")
+    
+    method = data['method'].upper()
+    endpoint = {
+        "endpoint": data['endpoint'],
+        "method": method,
+        "output_encoding": "json",
+        "backend": [
+            {
+                "url_pattern": data.get('backend_path', data['endpoint']),
+                "encoding": "json",
+                "sd": "static",
+                "method": method,
+                "host": backend_hosts(data)
+            }
+        ]
+    }
+    apply_performance_settings(endpoint, data)
+    return endpoint
+
+def update_endpoint(endpoint, data):
+    """Apply the fields of an update request to an existing endpoint definition"""
+    backend = endpoint.setdefault('backend', [{}])[0]
+    if 'backend_host' in data or 'backend_hosts' in data:
+        backend['host'] = backend_hosts(data)
+    if 'backend_path' in data:
+        backend['url_pattern'] = data['backend_path']
+    apply_performance_settings(endpoint, data)
+
 @app.route('/endpoints', methods=['POST'])
 @require_auth
 def add_endpoint():
     """Add new endpoint with request logging"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
         
         # Log this configuration change
+        hosts = data.get('backend_hosts')
         log_request_to_db(
             method='POST',
             endpoint='/endpoints',
             status_code=200,
             response_time=0,
             client_ip=request.remote_addr,
-            backend_url=data.get('backend_host', 'N/A')
+            backend_url=str(data.get('backend_host') or (','.join(map(str, hosts)) if isinstance(hosts, list) else '')
+                            or 'N/A')
         )
         
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-        
-        new_endpoint = {
-            "endpoint": data['endpoint'],
-            "method": data['method'],
-            "output_encoding": "json",
-            "backend": [
-                {
-                    "url_pattern": data.get('backend_path', data['endpoint']),
-                    "encoding": "json",
-                    "sd": "static",
-                    "method": data['method'],
-                    "host": [data['backend_host']]
-                }
-            ]
-        }
-        
-        if 'endpoints' not in config:
-            config['endpoints'] = []
-        
-        config['endpoints'].append(new_endpoint)
+        try:
+            new_endpoint = build_endpoint(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Create backup before saving
-        backup_config()
-        
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(config, f, indent=2)
+        with config_write_lock:
+            config = config_cache.load_mutable()
+            
+            if 'endpoints' not in config:
+                config['endpoints'] = []
+            
+            config['endpoints'].append(new_endpoint)
+            
+            # Create backup before saving
+            backup_config(reason='add_endpoint')
+            save_config(config)
         
         return jsonify({
             'message': 'Endpoint added successfully',
@@ -358,106 +3028,1110 @@ def add_endpoint():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/validate')
+def apply_endpoint_operation(endpoints, index, operation):
+    """Apply one batch operation to the endpoint list in place and describe the outcome
+    
+    endpoints may contain None slots left by earlier removals in the batch;
+    index maps (METHOD, path) to list positions and is kept current.
+    """
+    op = operation.get('op')
+    path = operation.get('endpoint')
+    if not path:
+        raise ValueError("'endpoint' is required")
+    if not isinstance(path, str):
+        raise ValueError("'endpoint' must be a string")
+    method = operation.get('method') or ''
+    if not isinstance(method, str):
+        raise ValueError("'method' must be a string")
+    method = method.upper()
+    
+    if op == 'add':
+        new_endpoint = build_endpoint(operation)
+        key = (new_endpoint['method'], path)
+        if key in index:
+            raise ValueError(f"{key[0]} {path} already exists")
+        index[key] = len(endpoints)
+        endpoints.append(new_endpoint)
+        return {'endpoint': new_endpoint}
+    
+    if op == 'update':
+        key = (method or 'GET', path)
+        if key not in index:
+            raise LookupError(f"{key[0]} {path} not found")
+        update_endpoint(endpoints[index[key]], operation)
+        return {'endpoint': endpoints[index[key]]}
+    
+    if op == 'remove':
+        # Without a method every method for the path goes, like DELETE /endpoints/<path>
+        keys = [(method, path)] if method else [k for k in index if k[1] == path]
+        keys = [k for k in keys if k in index]
+        if not keys:
+            raise LookupError(f"{method or 'Endpoint'} {path} not found")
+        for key in keys:
+            endpoints[index.pop(key)] = None
+        return {'removed': len(keys)}
+    
+    raise ValueError(f"Unknown op: {op!r} (expected add, update or remove)")
+
+def issue_key(issue, endpoints):
+    """What identifies a validation issue across edits that renumber the endpoints"""
+    routes = tuple((str(endpoints[i].get('method', 'GET')).upper(), str(endpoints[i].get('endpoint')))
+                   for i in issue['endpoints'])
+    return issue['code'], routes, re.sub(r'^Endpoint \d+: ', '', issue['message'])
+
+@app.route('/endpoints/batch', methods=['POST'])
 @require_auth
-def validate_config():
-    """Validate KrakenD configuration with enhanced checks"""
+def batch_endpoints():
+    """Apply a list of add/update/remove operations as one config change
+    
+    Body: {"operations": [{"op": "add", "endpoint": ..., "method": ...,
+    "backend_host": ..., "backend_path": ..., plus any performance settings
+    accepted by apply_performance_settings}, {"op": "update", ...},
+    {"op": "remove", "endpoint": ..., "method": optional}], "dry_run": false}.
+    Nothing is written unless every operation succeeds and the result adds
+    no new validation errors; then one backup and one atomic write are made.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': "Provide a non-empty 'operations' array"}), 400
+    
     try:
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-        
-        issues = []
+        with config_write_lock:
+            config = config_cache.load_mutable()
+            endpoints = config.get('endpoints', [])
+            before = {issue_key(issue, endpoints) for issue in config_cache.derived('validation', run_validation)['issues']
+                      if issue['severity'] == 'error'}
+            
+            index = {(ep.get('method', 'GET').upper(), ep.get('endpoint')): i for i, ep in enumerate(endpoints)}
+            
+            results = []
+            failed = False
+            for i, operation in enumerate(operations):
+                try:
+                    if not isinstance(operation, dict):
+                        raise ValueError('Operation must be an object')
+                    result = dict(index=i, op=operation.get('op'), status='ok', **apply_endpoint_operation(endpoints, index, operation))
+                except (ValueError, LookupError) as e:
+                    failed = True
+                    result = {'index': i, 'op': operation.get('op') if isinstance(operation, dict) else None,
+                              'status': 'error', 'error': str(e)}
+                results.append(result)
+            
+            config['endpoints'] = [ep for ep in endpoints if ep is not None]
+            new_errors = [] if failed else [
+                issue for issue in run_validation(config)['issues']
+                if issue['severity'] == 'error' and issue_key(issue, config['endpoints']) not in before
+            ]
+            
+            accepted = not failed and not new_errors
+            applied = accepted and not data.get('dry_run')
+            if applied:
+                backup_config(reason='batch')
+                save_config(config)
         
-        # Basic validation
-        if 'version' not in config:
-            issues.append("Missing 'version' field")
+        return jsonify({
+            'applied': applied,
+            'dry_run': bool(data.get('dry_run')),
+            'results': results,
+            'validation_errors': new_errors,
+            'endpoints_count': len(config['endpoints'])
+        }), 200 if accepted else 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ================================================================================
+# CONFIG VALIDATION
+# ================================================================================
+
+PLACEHOLDER_PATTERN = re.compile(r'\{([^{}]+)\}')
+
+class RouteNode:
+    """One path segment position in a per-method route trie"""
+    __slots__ = ('static', 'param', 'param_name', 'param_owner', 'wildcard', 'terminal')
+
+    def __init__(self):
+        self.static = {}
+        self.param = None
+        self.param_name = None
+        self.param_owner = None
+        self.wildcard = None
+        self.terminal = None
+
+def make_issue(severity, code, message, endpoints):
+    return {'severity': severity, 'code': code, 'message': message, 'endpoints': endpoints}
+
+def describe_route(endpoints, index):
+    endpoint = endpoints[index]
+    return f"{endpoint.get('method', 'GET')} {endpoint.get('endpoint')}"
+
+def insert_route(root, endpoints, index, issues):
+    """Add one endpoint to its method trie, reporting duplicates and placeholder collisions"""
+    node = root
+    segments = [segment for segment in endpoints[index]['endpoint'].split('/') if segment]
+    for position, segment in enumerate(segments):
+        if segment == '*' or segment.startswith('*'):
+            if position != len(segments) - 1:
+                issues.append(make_issue('error', 'invalid_wildcard',
+                    f"Wildcard must be the last segment: {describe_route(endpoints, index)}", [index]))
+                return
+            if node.wildcard is not None:
+                issues.append(make_issue('error', 'duplicate_endpoint',
+                    f"Duplicate endpoint found: {describe_route(endpoints, index)}", [node.wildcard, index]))
+            else:
+                node.wildcard = index
+            return
         
-        if 'port' not in config:
-            issues.append("Missing 'port' field")
+        if segment[0] == '{' and segment[-1] == '}':
+            name = segment[1:-1]
+            if node.param is None:
+                node.param = RouteNode()
+                node.param_name = name
+                node.param_owner = index
+            elif node.param_name != name:
+                # The router needs one name per position, so these can't both be registered
+                issues.append(make_issue('error', 'placeholder_collision',
+                    f"Placeholder {{{name}}} in {describe_route(endpoints, index)} collides with "
+                    f"{{{node.param_name}}} in {describe_route(endpoints, node.param_owner)}",
+                    [node.param_owner, index]))
+            node = node.param
+        else:
+            node = node.static.setdefault(segment, RouteNode())
+    
+    if node.terminal is None:
+        node.terminal = index
+    elif endpoints[node.terminal]['endpoint'] == endpoints[index]['endpoint']:
+        issues.append(make_issue('error', 'duplicate_endpoint',
+            f"Duplicate endpoint found: {describe_route(endpoints, index)}", [node.terminal, index]))
+    else:
+        # Same segments, spelled differently: a trailing or doubled slash
+        issues.append(make_issue('warning', 'equivalent_endpoint',
+            f"{describe_route(endpoints, index)} differs from {describe_route(endpoints, node.terminal)} "
+            f"only by slashes; the router may treat them as one route", [node.terminal, index]))
+
+def build_route_tries(config):
+    """Per-method route tries for matching concrete request paths to endpoints"""
+    endpoints = config.get('endpoints', [])
+    tries = {}
+    for i, endpoint in enumerate(endpoints):
+        if 'endpoint' in endpoint:
+            insert_route(tries.setdefault(endpoint.get('method', 'GET').upper(), RouteNode()), endpoints, i, [])
+    return tries
+
+def match_route(node, segments, position=0):
+    """Endpoint index for a request path, preferring static over placeholder over wildcard"""
+    if position == len(segments):
+        return node.terminal
+    child = node.static.get(segments[position])
+    if child is not None:
+        found = match_route(child, segments, position + 1)
+        if found is not None:
+            return found
+    if node.param is not None:
+        found = match_route(node.param, segments, position + 1)
+        if found is not None:
+            return found
+    return node.wildcard
+
+def subtree_routes(node):
+    stack, routes = [node], []
+    while stack:
+        current = stack.pop()
+        if current.terminal is not None:
+            routes.append(current.terminal)
+        if current.wildcard is not None:
+            routes.append(current.wildcard)
+        stack.extend(current.static.values())
+        if current.param is not None:
+            stack.append(current.param)
+    return routes
+
+def overlapping_routes(static_node, param_node, pairs):
+    """Walk two subtrees that match the same request prefixes and collect routes matching the same paths
+    
+    A segment is matched by both sides when it is the same static segment,
+    or when either side has a placeholder there.
+    """
+    stack = [(static_node, param_node)]
+    while stack:
+        a, b = stack.pop()
+        if a.terminal is not None and b.terminal is not None:
+            pairs.add((a.terminal, b.terminal))
+        for segment, child in a.static.items():
+            if segment in b.static:
+                stack.append((child, b.static[segment]))
+            if b.param is not None:
+                stack.append((child, b.param))
+        if a.param is not None:
+            for child in b.static.values():
+                stack.append((a.param, child))
+            if b.param is not None:
+                stack.append((a.param, b.param))
+
+def find_shadowed_routes(root, endpoints, issues):
+    """Report static routes overlapped by placeholder routes and routes hidden under a wildcard"""
+    pairs = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.param is not None:
+            for child in node.static.values():
+                overlapping_routes(child, node.param, pairs)
+        if node.wildcard is not None:
+            for child in list(node.static.values()) + ([node.param] if node.param else []):
+                for shadowed in subtree_routes(child):
+                    issues.append(make_issue('warning', 'shadowed_route',
+                        f"{describe_route(endpoints, shadowed)} is shadowed by wildcard "
+                        f"{describe_route(endpoints, node.wildcard)}", [node.wildcard, shadowed]))
+        stack.extend(node.static.values())
+        if node.param is not None:
+            stack.append(node.param)
+    
+    for static_route, param_route in sorted(pairs):
+        issues.append(make_issue('warning', 'shadowed_route',
+            f"{describe_route(endpoints, static_route)} overlaps {describe_route(endpoints, param_route)}; "
+            f"requests to it depend on router precedence", [param_route, static_route]))
+
+def check_backend_placeholders(endpoints, index, issues):
+    """Every {placeholder} in a backend url_pattern must come from the endpoint path"""
+    endpoint = endpoints[index]
+    available = None
+    for b, backend in enumerate(endpoint.get('backend') or []):
+        url_pattern = backend.get('url_pattern', '')
+        if '{' not in url_pattern:
+            continue
+        if available is None:
+            available = set(PLACEHOLDER_PATTERN.findall(endpoint['endpoint']))
+        for name in PLACEHOLDER_PATTERN.findall(url_pattern):
+            # {JWT.sub}-style and sequential {resp0_field} values are resolved elsewhere
+            if name in available or '.' in name or re.match(r'resp\d+_', name):
+                continue
+            issues.append(make_issue('error', 'unknown_placeholder',
+                f"{describe_route(endpoints, index)}: backend {b} url_pattern uses {{{name}}}, "
+                f"which the endpoint path does not define", [index]))
+
+def check_performance_settings(endpoints, index, issues):
+    """Out-of-bounds tuning values are errors; concurrent calls on writes are risky"""
+    endpoint = endpoints[index]
+    for error in endpoint_setting_errors(endpoint):
+        issues.append(make_issue('error', 'invalid_setting', f"{describe_route(endpoints, index)}: {error}", [index]))
+    concurrent = endpoint.get('concurrent_calls')
+    if isinstance(concurrent, int) and concurrent > 1 and endpoint.get('method', 'GET').upper() not in ('GET', 'HEAD'):
+        issues.append(make_issue('warning', 'concurrent_write',
+            f"{describe_route(endpoints, index)}: concurrent_calls sends the request {concurrent} times "
+            f"to the backend; only use it for idempotent methods", [index]))
+
+def run_validation(config):
+    """Check a parsed config and describe the result with structured issues
+    
+    Routes go into one trie per method, so duplicate, colliding and shadowed
+    routes are found without comparing every endpoint against every other.
+    """
+    issues = []
+    
+    # Basic validation
+    if 'version' not in config:
+        issues.append(make_issue('error', 'missing_field', "Missing 'version' field", []))
+    
+    if 'port' not in config:
+        issues.append(make_issue('error', 'missing_field', "Missing 'port' field", []))
+    
+    endpoints = config.get('endpoints', [])
+    tries = {}
+    
+    # Validate endpoints
+    for i, endpoint in enumerate(endpoints):
+        if 'endpoint' not in endpoint:
+            issues.append(make_issue('error', 'missing_field', f"Endpoint {i}: Missing 'endpoint' field", [i]))
+            continue
         
-        endpoints = config.get('endpoints', [])
+        if 'backend' not in endpoint or not endpoint['backend']:
+            issues.append(make_issue('error', 'missing_backend',
+                f"Endpoint {i}: Missing or empty 'backend' configuration", [i]))
         
-        # Validate endpoints
-        for i, endpoint in enumerate(endpoints):
-            if 'endpoint' not in endpoint:
-                issues.append(f"Endpoint {i}: Missing 'endpoint' field")
-            
-            if 'backend' not in endpoint or not endpoint['backend']:
-                issues.append(f"Endpoint {i}: Missing or empty 'backend' configuration")
-            
-            # Check for duplicate endpoints
-            endpoint_path = endpoint.get('endpoint')
-            method = endpoint.get('method', 'GET')
-            duplicates = [e for e in endpoints if e.get('endpoint') == endpoint_path and e.get('method') == method]
-            if len(duplicates) > 1:
-                issues.append(f"Duplicate endpoint found: {method} {endpoint_path}")
+        insert_route(tries.setdefault(endpoint.get('method', 'GET').upper(), RouteNode()), endpoints, i, issues)
+        check_backend_placeholders(endpoints, i, issues)
+        check_performance_settings(endpoints, i, issues)
+    
+    for root in tries.values():
+        find_shadowed_routes(root, endpoints, issues)
+    
+    errors = sum(1 for issue in issues if issue['severity'] == 'error')
+    return {
+        'valid': errors == 0,
+        'issues': issues,
+        'error_count': errors,
+        'warning_count': len(issues) - errors,
+        'endpoints_count': len(endpoints),
+        'validation_time': datetime.now().isoformat()
+    }
+
+@app.route('/validate')
+@require_auth
+def validate_config():
+    """Validate KrakenD configuration with enhanced checks
+    
+    The result is cached per config content and served with an ETag.
+    """
+    try:
+        entry = config_cache.get()
+        etag = f'"{entry["digest"][:32]}"'
+        if client_has_etag(etag):
+            return not_modified(etag)
         
-        return jsonify({
-            'valid': len(issues) == 0,
-            'issues': issues,
-            'endpoints_count': len(endpoints),
-            'config_size': os.path.getsize(CONFIG_PATH),
-            'validation_time': datetime.now().isoformat()
-        })
+        result = dict(config_cache.derived('validation', run_validation), config_size=len(entry['raw']))
+        response = jsonify(result)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e), 'valid': False}), 500
 
+class RestartQueue:
+    """Single worker that debounces restart requests and merges them into one restart
+    
+    Every request gets its own job id right away. Jobs queued while a restart
+    is pending join it; jobs queued while one is running wait for the next.
+    The config is validated before the gateway is touched.
+    
+    With shared=True (multi-worker mode) submit() only records the job as
+    queued in the database; the leader's worker, started by start_leader(),
+    batches the queued jobs of every worker the same way, so a burst spread
+    over several workers still causes one restart.
+    """
+
+    def __init__(self, debounce, max_wait, shared=False):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.shared = shared
+        self.jobs = OrderedDict()
+        self._pending = []
+        self._first_at = None
+        self._last_at = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='restart-worker', daemon=True)
+        self._thread.start()
+
+    def submit(self, reason, requested_by=None):
+        if self.shared:
+            job = self._new_job(reason, requested_by, merged_into=None)
+            self._persist([job])
+            event_broadcaster.publish('restart', job)
+            return job
+        
+        now = time.monotonic()
+        with self._condition:
+            self._ensure_started()
+            job = self._new_job(reason, requested_by, self._pending[0] if self._pending else None)
+            self.jobs[job['id']] = job
+            while len(self.jobs) > RESTART_JOB_HISTORY:
+                self.jobs.popitem(last=False)
+            
+            self._pending.append(job['id'])
+            self._first_at = self._first_at or now
+            self._last_at = now
+            self._condition.notify()
+            job = dict(job)
+        self._persist([job])
+        event_broadcaster.publish('restart', job)
+        return job
+
+    @staticmethod
+    def _new_job(reason, requested_by, merged_into):
+        return {
+            'id': uuid.uuid4().hex[:12],
+            'status': 'queued',
+            'reason': reason,
+            'requested_by': requested_by,
+            'requested_at': datetime.now().isoformat(),
+            'merged_into': merged_into
+        }
+
+    def get(self, job_id):
+        with self._condition:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        # Submitted through another worker
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            row = conn.execute('SELECT job FROM restart_jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit=20):
+        if shared_state is not None:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                rows = conn.execute('SELECT job FROM restart_jobs ORDER BY requested_at DESC LIMIT ?', (limit,)).fetchall()
+            finally:
+                conn.close()
+            return [json.loads(row[0]) for row in rows]
+        with self._condition:
+            return [dict(job) for job in list(self.jobs.values())[-limit:]][::-1]
+
+    def _persist(self, jobs):
+        try:
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO restart_jobs (id, requested_at, job) VALUES (?, ?, ?)',
+                                     [(job['id'], job['requested_at'], json.dumps(job)) for job in jobs])
+                    conn.execute('''
+                        DELETE FROM restart_jobs WHERE id NOT IN (
+                            SELECT id FROM restart_jobs ORDER BY requested_at DESC LIMIT ?
+                        )
+                    ''', (RESTART_JOB_HISTORY,))
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"Error persisting restart jobs: {e}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                # Wait for a quiet period, but never longer than max_wait overall
+                while True:
+                    deadline = min(self._last_at + self.debounce, self._first_at + self.max_wait)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                
+                batch, self._pending = self._pending, []
+                self._first_at = self._last_at = None
+                started_at = datetime.now().isoformat()
+                running = []
+                for job_id in batch:
+                    if job_id in self.jobs:
+                        self.jobs[job_id].update(status='running', started_at=started_at, batch_size=len(batch))
+                        running.append(dict(self.jobs[job_id]))
+            self._persist(running)
+            
+            outcome = self._restart()
+            outcome['finished_at'] = datetime.now().isoformat()
+            
+            with self._condition:
+                finished = []
+                for job_id in batch:
+                    if job_id in self.jobs:
+                        self.jobs[job_id].update(outcome)
+                        finished.append(dict(self.jobs[job_id]))
+            self._persist(finished)
+            for job in finished:
+                event_broadcaster.publish('restart', job)
+
+    def start_leader(self):
+        """Run the jobs queued by every worker; only the elected leader calls this"""
+        threading.Thread(target=self._run_shared, name='restart-worker', daemon=True).start()
+
+    def _run_shared(self):
+        while True:
+            time.sleep(RESTART_POLL_INTERVAL)
+            try:
+                conn = sqlite3.connect(DB_PATH)
+                try:
+                    rows = conn.execute('''
+                        SELECT job FROM restart_jobs
+                        WHERE json_extract(job, '$.status') = 'queued'
+                        ORDER BY requested_at
+                    ''').fetchall()
+                finally:
+                    conn.close()
+                batch = [json.loads(row[0]) for row in rows]
+                if not batch:
+                    continue
+                
+                # Same debounce as the single-process queue, timed by the request times
+                requested = [datetime.fromisoformat(job['requested_at']).timestamp() for job in batch]
+                if time.time() < min(max(requested) + self.debounce, min(requested) + self.max_wait):
+                    continue
+                
+                started_at = datetime.now().isoformat()
+                for job in batch:
+                    job.update(status='running', started_at=started_at, batch_size=len(batch),
+                               merged_into=batch[0]['id'] if job is not batch[0] else None)
+                self._persist(batch)
+                
+                outcome = self._restart()
+                outcome['finished_at'] = datetime.now().isoformat()
+                for job in batch:
+                    job.update(outcome)
+                self._persist(batch)
+                for job in batch:
+                    event_broadcaster.publish('restart', job)
+            except Exception as e:
+                print(f"Error running queued restarts: {e}")
+
+    def _restart(self):
+        try:
+            validation = config_cache.derived('validation', run_validation)
+            if not validation['valid']:
+                return {
+                    'status': 'failed',
+                    'error': 'Config has validation errors; restart skipped',
+                    'validation_errors': [i for i in validation['issues'] if i['severity'] == 'error']
+                }
+            
+            result = subprocess.run(['docker-compose', 'restart', 'krakend'],
+                                    capture_output=True, text=True, cwd='/workspace', timeout=RESTART_TIMEOUT)
+            if result.returncode == 0:
+                return {'status': 'succeeded', 'message': 'KrakenD restarted successfully'}
+            return {'status': 'failed', 'error': f'Restart failed: {result.stderr}'}
+        except Exception as e:
+            return {'status': 'failed', 'error': str(e)}
+
+restart_queue = RestartQueue(RESTART_DEBOUNCE, RESTART_MAX_WAIT, shared=shared_state is not None)
+
 @app.route('/restart', methods=['POST'])
 @require_auth
 def restart_gateway():
-    """Restart KrakenD gateway with logging"""
+    """Queue a KrakenD restart and return its job id immediately"""
     try:
         # Log restart action
         log_request_to_db(
             method='POST',
             endpoint='/restart',
-            status_code=200,
+            status_code=202,
             response_time=0,
             client_ip=request.remote_addr,
             backend_url='system'
         )
         
-        # In a real implementation, this would restart the actual KrakenD process
-        # For now, we'll simulate it
-        result = subprocess.run(['docker-compose', 'restart', 'krakend'], 
-                              capture_output=True, text=True, cwd='/workspace')
+        job = restart_queue.submit('manual', session.get('user'))
+        return jsonify({
+            'message': 'Restart queued',
+            'job_id': job['id'],
+            'job': job,
+            'timestamp': datetime.now().isoformat()
+        }), 202
+            
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/restart/jobs')
+@require_auth
+def list_restart_jobs():
+    return jsonify({'jobs': restart_queue.recent()})
+
+@app.route('/restart/jobs/<job_id>')
+@require_auth
+def get_restart_job(job_id):
+    """Poll one restart job; updates are also pushed on /api/monitoring/stream"""
+    job = restart_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job})
+
+# ================================================================================
+# BACKEND HOST POOLS
+# ================================================================================
+
+class HostPoolManager:
+    """Eject failing hosts from multi-host backend pools and readmit them on recovery
+    
+    Decisions come from the health scheduler's consecutive probe counts, with
+    a higher bar to come back than to leave. Each pass applies every change
+    in one config write (with a backup) and queues one gateway restart.
+    """
+
+    def __init__(self):
+        self.last_pass = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='host-pool-manager', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(POOL_CHECK_INTERVAL)
+            try:
+                self.rebalance()
+            except Exception as e:
+                print(f"Host pool rebalance failed: {e}")
+
+    def _ejections(self, conn):
+        rows = conn.execute('''
+            SELECT method, endpoint, backend_index, host, pool, ejected_at FROM host_ejections
+        ''').fetchall()
+        return [dict(zip(('method', 'endpoint', 'backend_index', 'host', 'pool', 'ejected_at'), row)) for row in rows]
+
+    def ejected_hosts(self):
+        """{host: [endpoint labels]} for hosts currently out of at least one pool"""
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            hosts = {}
+            for ejection in self._ejections(conn):
+                hosts.setdefault(ejection['host'].rstrip('/'), []).append(
+                    f"{ejection['method']} {ejection['endpoint']}")
+            return hosts
+        finally:
+            conn.close()
+
+    def status(self):
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            ejections = self._ejections(conn)
+        finally:
+            conn.close()
+        for ejection in ejections:
+            ejection['pool'] = json.loads(ejection['pool'])
+            ejection['ejected_at'] = datetime.fromtimestamp(ejection['ejected_at']).isoformat()
+        return {'enabled': POOL_EJECTION_ENABLED, 'ejections': ejections, 'last_pass': self.last_pass}
+
+    def rebalance(self):
+        """One pass over all pools; returns the changes made"""
+        if not health_scheduler.running:
+            return []
+        health = health_scheduler.snapshot()
+        now = time.time()
         
-        if result.returncode == 0:
-            return jsonify({
-                'message': 'KrakenD restarted successfully',
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                'error': f'Restart failed: {result.stderr}',
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        with self._lock, config_write_lock:
+            config = config_cache.load_mutable()
+            backends = {}
+            for endpoint in config.get('endpoints', []):
+                for b, backend in enumerate(endpoint.get('backend') or []):
+                    backends[(endpoint.get('method', 'GET').upper(), endpoint.get('endpoint'), b)] = backend
             
+            conn = sqlite3.connect(DB_PATH)
+            try:
+                existing = self._ejections(conn)
+                pools = {}
+                for ejection in existing:
+                    ejection['key'] = (ejection['method'], ejection['endpoint'], ejection['backend_index'])
+                    pools[ejection['key']] = json.loads(ejection['pool'])
+                
+                readmitted, dropped, changed = [], [], False
+                for ejection in existing:
+                    backend = backends.get(ejection['key'])
+                    pool = pools[ejection['key']]
+                    hosts = backend.get('host') if backend else None
+                    # The route or its pool was changed by hand: the operator owns it now
+                    if not isinstance(hosts, list) or not set(hosts) <= set(pool):
+                        dropped.append(ejection)
+                        continue
+                    state = health.get(ejection['host'].rstrip('/'))
+                    if state and state['consecutive_successes'] >= POOL_READMIT_SUCCESSES and \
+                            now - ejection['ejected_at'] >= POOL_MIN_EJECTION:
+                        if ejection['host'] not in hosts:
+                            hosts.append(ejection['host'])
+                            hosts.sort(key=pool.index)
+                            changed = True
+                        readmitted.append(ejection)
+                
+                still_out = {ejection['key'] + (ejection['host'],) for ejection in existing
+                             if ejection not in readmitted and ejection not in dropped}
+                ejected = []
+                for key, backend in backends.items():
+                    hosts = backend.get('host')
+                    if not isinstance(hosts, list) or len(hosts) <= POOL_MIN_HOSTS:
+                        continue
+                    pool = pools.get(key, list(hosts))
+                    for host in list(hosts):
+                        state = health.get(host.rstrip('/'))
+                        if not state or state['consecutive_failures'] < POOL_EJECT_FAILURES:
+                            continue
+                        if len(hosts) <= POOL_MIN_HOSTS:
+                            break
+                        hosts.remove(host)
+                        changed = True
+                        if key + (host,) not in still_out:
+                            ejected.append({'method': key[0], 'endpoint': key[1], 'backend_index': key[2],
+                                            'host': host, 'pool': json.dumps(pool), 'ejected_at': now})
+                
+                # The health scheduler keeps probing hosts found in the config or in
+                # host_ejections, so a host must be in one of them at every moment:
+                # record ejections before the config drops the host, and forget
+                # readmissions only after the config has it back
+                with conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO host_ejections (method, endpoint, backend_index, host, pool, ejected_at)
+                        VALUES (:method, :endpoint, :backend_index, :host, :pool, :ejected_at)
+                    ''', ejected)
+                if changed:
+                    try:
+                        backup_config(reason='host_pool_rebalance')
+                        save_config(config)
+                    except BaseException:
+                        with conn:
+                            conn.executemany('''
+                                DELETE FROM host_ejections
+                                WHERE method = ? AND endpoint = ? AND backend_index = ? AND host = ?
+                            ''', [(e['method'], e['endpoint'], e['backend_index'], e['host']) for e in ejected])
+                        raise
+                    if not RESTART_ON_CONFIG_CHANGE:
+                        restart_queue.submit('backend pool change')
+                
+                with conn:
+                    conn.executemany('''
+                        DELETE FROM host_ejections WHERE method = ? AND endpoint = ? AND backend_index = ? AND host = ?
+                    ''', [(e['method'], e['endpoint'], e['backend_index'], e['host']) for e in readmitted + dropped])
+            finally:
+                conn.close()
+        
+        changes = [dict(action='ejected', host=e['host'], route=f"{e['method']} {e['endpoint']}") for e in ejected] + \
+                  [dict(action='readmitted', host=e['host'], route=f"{e['method']} {e['endpoint']}") for e in readmitted]
+        self.last_pass = {'at': datetime.now().isoformat(), 'changes': changes, 'forgotten': len(dropped)}
+        if changes:
+            event_broadcaster.publish('pools', self.last_pass)
+        return changes
+
+host_pool_manager = HostPoolManager()
+
+@app.route('/api/pools')
+@require_auth
+def pool_status():
+    """Hosts currently ejected from backend pools"""
+    try:
+        return jsonify(host_pool_manager.status())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def backup_config():
-    """Create a backup of the current configuration"""
+@app.route('/api/pools/rebalance', methods=['POST'])
+@require_auth
+def rebalance_pools():
+    """Run one ejection/readmission pass now"""
     try:
-        if not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
+        return jsonify({'changes': host_pool_manager.rebalance(), 'scheduler_running': health_scheduler.running})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ================================================================================
+# CONFIG BACKUP STORE
+# ================================================================================
+
+def canonical_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':'))
+
+def json_diff(old, new):
+    """Compact structural diff turning old into new; None when they are equal"""
+    if old == new:
+        return None
+    
+    if isinstance(old, dict) and isinstance(new, dict):
+        diff = {}
+        removed = [key for key in old if key not in new]
+        if removed:
+            diff['del'] = removed
+        for key, value in new.items():
+            if key not in old:
+                diff.setdefault('set', {})[key] = value
+            elif old[key] != value:
+                child = json_diff(old[key], value)
+                if child.get('t') == 'v':
+                    diff.setdefault('set', {})[key] = value
+                else:
+                    diff.setdefault('sub', {})[key] = child
+        return dict(t='d', **diff)
+    
+    if isinstance(old, list) and isinstance(new, list):
+        # Diff list items by their canonical form so appends and removals stay small
+        matcher = difflib.SequenceMatcher(None, [canonical_json(v) for v in old],
+                                          [canonical_json(v) for v in new], autojunk=False)
+        ops = [[i1, i2, new[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+        return {'t': 'l', 'ops': ops}
+    
+    return {'t': 'v', 'v': new}
+
+def json_patch(old, diff):
+    """Apply a json_diff result; returns a new value and leaves old untouched"""
+    if diff is None:
+        return old
+    if diff['t'] == 'v':
+        return diff['v']
+    if diff['t'] == 'l':
+        result = list(old)
+        for i1, i2, items in reversed(diff['ops']):
+            result[i1:i2] = items
+        return result
+    
+    result = dict(old)
+    for key in diff.get('del', []):
+        result.pop(key, None)
+    for key, child in diff.get('sub', {}).items():
+        result[key] = json_patch(old[key], child)
+    result.update(diff.get('set', {}))
+    return result
+
+class BackupStore:
+    """Content-addressed, gzip-compressed config history
+    
+    Objects are keyed by the SHA-256 of the canonical config JSON, so an
+    identical config is stored once no matter how often it is backed up.
+    Each object is a full checkpoint or a diff against the previous object,
+    with chains capped at BACKUP_CHECKPOINT_EVERY. A small SQLite index in
+    BACKUP_DIR lists revisions without touching the objects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready_for = None
+        # (digest, config) of the last snapshot, the usual base for the next diff
+        self._last = (None, None)
+
+    def _connect(self):
+        if self._ready_for != BACKUP_DIR:
+            os.makedirs(os.path.join(BACKUP_DIR, 'objects'), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(BACKUP_DIR, 'backups.db'))
+        if self._ready_for != BACKUP_DIR:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    base_digest TEXT,
+                    depth INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS revisions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    reason TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_revisions_created_at ON revisions (created_at);
+            ''')
+            self._ready_for = BACKUP_DIR
+        return conn
+
+    def _object_path(self, digest):
+        return os.path.join(BACKUP_DIR, 'objects', digest[:2], f'{digest}.json.gz')
+
+    def _write_object(self, digest, payload):
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = gzip.compress(canonical_json(payload).encode(), compresslevel=6)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        return len(data)
+
+    def _reconstruct(self, conn, digest):
+        """Walk back to the nearest full checkpoint, then apply diffs forward"""
+        chain = []
+        while digest is not None:
+            kind, base_digest = conn.execute(
+                'SELECT kind, base_digest FROM objects WHERE digest = ?', (digest,)
+            ).fetchone()
+            with gzip.open(self._object_path(digest), 'rt') as f:
+                chain.append(json.load(f))
+            digest = base_digest if kind == 'diff' else None
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'krakend_config_{timestamp}.json'
-        backup_path = os.path.join(BACKUP_DIR, backup_filename)
+        config = chain.pop()
+        while chain:
+            config = json_patch(config, chain.pop())
+        return config
+
+    def snapshot(self, config, reason=None):
+        """Record config as a revision; returns the revision id, or None if unchanged"""
+        digest = hashlib.sha256(canonical_json(config).encode()).hexdigest()
+        with self._lock:
+            conn = self._connect()
+            try:
+                latest = conn.execute('SELECT digest FROM revisions ORDER BY id DESC LIMIT 1').fetchone()
+                if latest and latest[0] == digest:
+                    return None
+                
+                with conn:
+                    if not conn.execute('SELECT 1 FROM objects WHERE digest = ?', (digest,)).fetchone():
+                        base = conn.execute('''
+                            SELECT o.digest, o.depth FROM revisions r JOIN objects o ON o.digest = r.digest
+                            ORDER BY r.id DESC LIMIT 1
+                        ''').fetchone()
+                        if base and base[1] + 1 < BACKUP_CHECKPOINT_EVERY:
+                            base_config = self._last[1] if self._last[0] == base[0] else self._reconstruct(conn, base[0])
+                            diff = json_diff(base_config, config)
+                            size = self._write_object(digest, diff)
+                            conn.execute('INSERT INTO objects VALUES (?, ?, ?, ?, ?)',
+                                         (digest, 'diff', base[0], base[1] + 1, size))
+                        else:
+                            size = self._write_object(digest, config)
+                            conn.execute('INSERT INTO objects VALUES (?, ?, ?, ?, ?)',
+                                         (digest, 'full', None, 0, size))
+                    
+                    cursor = conn.execute(
+                        'INSERT INTO revisions (created_at, digest, reason) VALUES (?, ?, ?)',
+                        (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), digest, reason)
+                    )
+                    revision_id = cursor.lastrowid
+                
+                self._last = (digest, config)
+                self._prune(conn)
+                return revision_id
+            finally:
+                conn.close()
+
+    def _prune(self, conn):
+        """Apply retention, then delete objects no kept revision can reach"""
+        with conn:
+            conn.execute('''
+                DELETE FROM revisions WHERE id <= (
+                    SELECT id FROM revisions ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+            ''', (BACKUP_RETENTION_COUNT,))
+            if BACKUP_RETENTION_DAYS > 0:
+                cutoff = datetime.utcnow() - timedelta(days=BACKUP_RETENTION_DAYS)
+                # Always keep the newest revision
+                conn.execute('''
+                    DELETE FROM revisions WHERE created_at < ?
+                    AND id < (SELECT MAX(id) FROM revisions)
+                ''', (cutoff.strftime('%Y-%m-%d %H:%M:%S'),))
         
-        with open(CONFIG_PATH, 'r') as src, open(backup_path, 'w') as dst:
-            dst.write(src.read())
+        bases = dict(conn.execute('SELECT digest, base_digest FROM objects').fetchall())
+        live = set()
+        for (digest,) in conn.execute('SELECT DISTINCT digest FROM revisions'):
+            while digest is not None and digest not in live:
+                live.add(digest)
+                digest = bases.get(digest)
         
-        # Keep only last 10 backups
-        backups = sorted([f for f in os.listdir(BACKUP_DIR) if f.startswith('krakend_config_')])
-        while len(backups) > 10:
-            os.remove(os.path.join(BACKUP_DIR, backups.pop(0)))
-            
+        dead = [digest for digest in bases if digest not in live]
+        if dead:
+            with conn:
+                conn.executemany('DELETE FROM objects WHERE digest = ?', [(d,) for d in dead])
+            for digest in dead:
+                try:
+                    os.remove(self._object_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit=50, before=None):
+        conn = self._connect()
+        try:
+            query = '''
+                SELECT r.id, r.created_at, r.digest, r.reason, o.kind, o.stored_size
+                FROM revisions r JOIN objects o ON o.digest = r.digest
+            '''
+            params = []
+            if before is not None:
+                query += ' WHERE r.id < ?'
+                params.append(before)
+            query += ' ORDER BY r.id DESC LIMIT ?'
+            rows = conn.execute(query, params + [limit]).fetchall()
+        finally:
+            conn.close()
+        return [
+            {'id': r[0], 'created_at': r[1], 'digest': r[2], 'reason': r[3], 'kind': r[4], 'stored_size': r[5]}
+            for r in rows
+        ]
+
+    def load(self, revision_id):
+        """The config stored for a revision, or None if it does not exist"""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT digest FROM revisions WHERE id = ?', (revision_id,)).fetchone()
+            return self._reconstruct(conn, row[0]) if row else None
+        finally:
+            conn.close()
+
+backup_store = BackupStore()
+
+def backup_config(reason=None):
+    """Create a backup of the current configuration"""
+    try:
+        backup_store.snapshot(config_cache.get()['config'], reason)
     except Exception as e:
         print(f"Backup failed: {e}")
 
+@app.route('/backups')
+@require_auth
+def list_backups():
+    """List config revisions, newest first; page with ?before=<id>"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'limit and before must be integers'}), 400
+    
+    try:
+        backups = backup_store.list(limit, before)
+        return jsonify({
+            'backups': backups,
+            'next_before': backups[-1]['id'] if len(backups) == limit else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/backups/<int:revision_id>')
+@require_auth
+def get_backup(revision_id):
+    """Get the config stored in one revision"""
+    try:
+        config = backup_store.load(revision_id)
+        if config is None:
+            return jsonify({'error': 'Backup not found'}), 404
+        return jsonify({'id': revision_id, 'config': config})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/backups/<int:revision_id>/diff')
+@require_auth
+def diff_backup(revision_id):
+    """Diff a revision against ?against=<id> (default: the live config)"""
+    try:
+        config = backup_store.load(revision_id)
+        if config is None:
+            return jsonify({'error': 'Backup not found'}), 404
+        
+        against = request.args.get('against', 'current')
+        if against == 'current':
+            other = config_cache.get()['config']
+        else:
+            other = backup_store.load(int(against))
+            if other is None:
+                return jsonify({'error': f'Backup {against} not found'}), 404
+        
+        old_endpoints = {(e.get('method', 'GET'), e.get('endpoint')): e for e in config.get('endpoints', [])}
+        new_endpoints = {(e.get('method', 'GET'), e.get('endpoint')): e for e in other.get('endpoints', [])}
+        return jsonify({
+            'from': revision_id,
+            'to': against,
+            'endpoints': {
+                'added': [f'{m} {p}' for m, p in new_endpoints if (m, p) not in old_endpoints],
+                'removed': [f'{m} {p}' for m, p in old_endpoints if (m, p) not in new_endpoints],
+                'changed': [f'{m} {p}' for (m, p), e in new_endpoints.items()
+                            if (m, p) in old_endpoints and old_endpoints[(m, p)] != e]
+            },
+            'diff': json_diff(config, other)
+        })
+    except ValueError:
+        return jsonify({'error': 'against must be a revision id or current'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/backups/<int:revision_id>/restore', methods=['POST'])
+@require_auth
+def restore_backup(revision_id):
+    """Make a revision the live config; the config it replaces is backed up first"""
+    try:
+        config = backup_store.load(revision_id)
+        if config is None:
+            return jsonify({'error': 'Backup not found'}), 404
+        
+        with config_write_lock:
+            backup_config(reason=f'before restore of {revision_id}')
+            save_config(config)
+        
+        return jsonify({'message': f'Restored backup {revision_id}', 'timestamp': datetime.now().isoformat()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/endpoints/<path:endpoint_path>', methods=['DELETE'])
 @require_auth
 def remove_endpoint(endpoint_path):
@@ -470,26 +4144,25 @@ def remove_endpoint(endpoint_path):
             status_code=200,
             response_time=0,
             client_ip=request.remote_addr,
-            backend_url='config'
+            backend_url='config',
+            route=request.url_rule.rule
         )
         
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
-        
         endpoint_path = '/' + endpoint_path if not endpoint_path.startswith('/') else endpoint_path
         
-        original_count = len(config.get('endpoints', []))
-        config['endpoints'] = [ep for ep in config.get('endpoints', []) 
-                             if ep.get('endpoint') != endpoint_path]
-        
-        if len(config['endpoints']) == original_count:
-            return jsonify({'error': 'Endpoint not found'}), 404
-        
-        # Create backup before saving
-        backup_config()
-        
-        with open(CONFIG_PATH, 'w') as f:
-            json.dump(config, f, indent=2)
+        with config_write_lock:
+            config = config_cache.load_mutable()
+            
+            original_count = len(config.get('endpoints', []))
+            config['endpoints'] = [ep for ep in config.get('endpoints', []) 
+                                 if ep.get('endpoint') != endpoint_path]
+            
+            if len(config['endpoints']) == original_count:
+                return jsonify({'error': 'Endpoint not found'}), 404
+            
+            # Create backup before saving
+            backup_config(reason='remove_endpoint')
+            save_config(config)
         
         return jsonify({'message': 'Endpoint removed successfully'})
         
@@ -521,7 +4194,8 @@ def documentation():
 def log_incoming_request():
     """Log incoming requests for monitoring"""
     # Skip logging for static files and auth checks
-    if request.endpoint in ['serve_static', 'auth_status', 'get_metrics', 'get_request_logs']:
+    if request.endpoint in ['serve_static', 'auth_status', 'get_metrics', 'get_request_logs', 'prometheus_metrics',
+                            'monitoring_stream', 'export_monitoring_data']:
         return
         
     request.start_time = time.time()
@@ -533,17 +4207,31 @@ def log_outgoing_response(response):
         response_time = int((time.time() - request.start_time) * 1000)
         
         # Skip logging for certain endpoints to avoid infinite loops
-        if request.endpoint not in ['get_metrics', 'get_request_logs', 'serve_static']:
+        if request.endpoint not in ['get_metrics', 'get_request_logs', 'serve_static', 'prometheus_metrics',
+                                    'monitoring_stream', 'export_monitoring_data']:
             log_request_to_db(
                 method=request.method,
                 endpoint=request.path,
                 status_code=response.status_code,
                 response_time=response_time,
-                client_ip=request.remote_addr
+                client_ip=request.remote_addr,
+                route=request.url_rule.rule if request.url_rule else None
             )
     
     return response
 
+def start_background_services():
+    """Start the workers that must run even when no dashboard is open"""
+    if HEALTH_SCHEDULER_ENABLED:
+        health_scheduler.start()
+    if KRAKEND_LOG_INGEST:
+        krakend_log_ingester.start()
+    retention_manager.start()
+    if HEALTH_SCHEDULER_ENABLED and POOL_EJECTION_ENABLED:
+        host_pool_manager.start()
+    if restart_queue.shared:
+        restart_queue.start_leader()
+
 if __name__ == '__main__':
     print("🚀 Enhanced KrakenD Management API starting...")
     print("📊 Real-time monitoring enabled")
@@ -554,4 +4242,8 @@ if __name__ == '__main__':
     print("   user / password123") 
     print("   demo / demo123")
     
+    # The debug reloader runs this script twice; only the serving child starts workers
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+    
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,32 @@
+# Production launch of the management API: gunicorn -c gunicorn.conf.py app:app
+#
+# Workers are forked from a master that has already imported the app, share
+# metric counters and the recent-request window through an mmap-backed file,
+# and elect one of themselves to run the background services.
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('MANAGER_PORT', '5001')}"
+workers = int(os.environ.get('MANAGER_WORKERS', multiprocessing.cpu_count()))
+# Threaded workers, so long-lived SSE streams don't each pin a whole process
+worker_class = 'gthread'
+threads = int(os.environ.get('MANAGER_THREADS', 8))
+timeout = 120
+preload_app = True
+
+# A fresh state directory per master, read by app.py at import time
+state_dir = tempfile.mkdtemp(prefix='krakend-manager-')
+os.environ['MANAGER_SHARED_STATE'] = os.path.join(state_dir, 'shared-state')
+leader_lock = os.path.join(state_dir, 'leader.lock')
+
+def post_fork(server, worker):
+    import app
+    # Reopen the shared state before the worker starts any request threads
+    if app.shared_state is not None:
+        app.shared_state.after_fork()
+    app.start_background_services_as_leader(leader_lock)
+
+def on_exit(server):
+    shutil.rmtree(state_dir, ignore_errors=True)